@@ -1,6 +1,6 @@
-import yfinance as yf
-import pandas as pd
-from datetime import datetime
+from instrumentation import start_run
+from price_store import PriceStore, YFinanceProvider
+from storage import write_table
 
 # --- 1. Define Your List of Valid Tickers ---
 valid_tickers = [
@@ -17,47 +17,27 @@ valid_tickers = [
 # --- 2. Set Date Range ---
 start_date = "2024-04-01"
 end_date = "2025-03-31"
-
-# --- 3. Download Helper ---
-def download_prices(ticker_list):
-    data = yf.download(
-        tickers=ticker_list,
-        start=start_date,
-        end=end_date,
-        interval="1d",
-        group_by="ticker",
-        auto_adjust=True,
-        threads=True,
-        progress=True
-    )
-    return data
-
-# --- 4. Chunk Helper ---
-def chunk_list(lst, chunk_size):
-    for i in range(0, len(lst), chunk_size):
-        yield lst[i:i + chunk_size]
-
-# --- 5. Download and Collect Closing Prices and Volume ---
-close_data = []
-volume_data = []
-
-for chunk in chunk_list(valid_tickers, 50):  # Smaller chunk to reduce risk of throttling
-    chunk_data = download_prices(chunk)
-    for ticker in chunk:
-        try:
-            df = chunk_data[ticker][['Close', 'Volume']].copy()
-            df_close = df[['Close']].rename(columns={"Close": ticker})
-            df_volume = df[['Volume']].rename(columns={"Volume": ticker})
-            close_data.append(df_close)
-            volume_data.append(df_volume)
-        except KeyError:
-            print(f"⚠️ Missing data for {ticker}")
-
-# --- 6. Merge All Into Two Separate DataFrames ---
-closing_prices_df = pd.concat(close_data, axis=1)
-volumes_df = pd.concat(volume_data, axis=1)
-
-# --- 7. Save to CSV ---
-closing_prices_df.to_csv("valid_tickers_closing_prices.csv")
-volumes_df.to_csv("valid_tickers_volumes.csv")
-print("✅ Done! Saved 'valid_tickers_closing_prices.csv' and 'valid_tickers_volumes.csv'")
+output_format = "parquet"  # or "csv"
+price_store_name = "price_store"  # long (ticker, date) table + price_store_ranges.json
+metrics = start_run("2. GetFinanceData")  # -> run_metrics/<run>/metrics.json
+
+# --- 3. Update the Local Price Store ---
+# Only the ranges a ticker is missing are downloaded: extending end_date fetches
+# the new days and a newly added ticker is backfilled on its own.
+# FileProvider() serves the same data from existing files instead of yfinance.
+with metrics.stage("update_price_store", rows_in=len(valid_tickers)) as stage:
+    store = PriceStore(price_store_name, fmt=output_format)
+    store.update(YFinanceProvider(chunk_size=50), valid_tickers, start_date, end_date)
+    stage.rows_out = len(store.prices)
+
+# --- 4. Wide Tables (Date + one column per ticker) ---
+with metrics.stage("wide_tables") as stage:
+    closing_prices_df = store.wide("closing_price", valid_tickers, start_date, end_date)
+    volumes_df = store.wide("volume", valid_tickers, start_date, end_date)
+    stage.rows_out = len(closing_prices_df)
+
+# --- 5. Save (parquet by default, set output_format = "csv" for the old files) ---
+closing_path = write_table(closing_prices_df, "valid_tickers_closing_prices", fmt=output_format)
+volume_path = write_table(volumes_df, "valid_tickers_volumes", fmt=output_format)
+print(f"✅ Done! Saved '{closing_path}' and '{volume_path}'")
+metrics.finish()
@@ -2,160 +2,125 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 import pytz
-import ast
-import pandas_market_calendars as mcal
-
-# Load data
-comments = pd.read_csv("comments_with_consensus.csv")
-submissions = pd.read_csv("submissions_with_consensus.csv")
-closing_price = pd.read_csv("valid_tickers_closing_prices.csv", parse_dates=["Date"])
-volume = pd.read_csv("valid_tickers_volumes.csv", parse_dates=["Date"])
-
-# Preprocess mentions
-comments["tickers_mentioned"] = comments["tickers_mentioned"].apply(
-    lambda x: ast.literal_eval(x) if pd.notnull(x) and isinstance(x, str) else []
-)
-submissions["companies_mentioned"] = submissions["companies_mentioned"].apply(
-    lambda x: ast.literal_eval(x) if pd.notnull(x) and isinstance(x, str) else []
-)
+from storage import append_table, latest_date, read_table, table_exists, to_utc, write_table
+from panel import CompactPanel, append_days, build_compact_panel, build_panel, load_panel
+from instrumentation import start_run
+from price_store import PriceStore
+from sentiment_features import add_like_scores, calc_general_sentiment, calc_sentiment_metrics, sentiment_mapping
+
+output_format = "parquet"  # or "csv"
+panel_name = "final_stock_sentiment_dataset2"
+price_store_name = "price_store"
+incremental = False  # True: only add the trading days after the last date in the saved panel
+compact_panel = False  # True: save the panel as CompactPanel tables (<panel_name>_market / _mentions) for large ticker lists
+stored_name = f"{panel_name}_market" if compact_panel else panel_name
+weight_duplicates = False  # True: a comment counts cluster_size times (near-duplicates folded into it by 1. ArcticShiftData.py)
+metrics = start_run("3. MakeDataFile")  # -> run_metrics/<run>/metrics.json
+
+# In incremental mode everything below only sees data after the saved panel's last date
+last_date = latest_date(stored_name, "date") if incremental and table_exists(stored_name) else None
+since = (last_date + pd.Timedelta(days=1)).strftime("%Y-%m-%d") if last_date is not None else None
+
+# Load data (parquet if available, otherwise csv) - only the columns we use. In incremental
+# mode partitioned tables only read the new dates; CSV rows are filtered on their timestamp
+# (UTC for comments, so the evening before can come along - it is dropped below)
+with metrics.stage("load") as stage:
+    comments = read_table("comments_with_consensus", columns=[
+        "post_created_utc", "comment_score", "tickers_mentioned", "consensus_score"
+    ] + (["cluster_size"] if weight_duplicates else []), start_date=since, date_column="post_created_utc")
+    if weight_duplicates:
+        comments = comments.rename(columns={"cluster_size": "weight"})
+    submissions = read_table("submissions_with_consensus", columns=[
+        "datetime_est", "score", "num_comments", "link_flair_text", "companies_mentioned", "consensus_score"
+    ], start_date=since, date_column="datetime_est")
+    # Prices and volumes in long format from the store filled by 2. GetFinanceData.py, for
+    # the tickers and date range of its last run (the columns and dates of its wide table)
+    universe = read_table("valid_tickers_closing_prices")
+    valid_tickers = [c for c in universe.columns if c != "Date"]
+    start_date = pd.to_datetime(universe["Date"]).min()
+    end_date = pd.to_datetime(universe["Date"]).max() + pd.Timedelta(days=1)
+    prices = PriceStore(price_store_name).long(
+        tickers=valid_tickers, start_date=last_date if last_date is not None else start_date, end_date=end_date
+    )
+    stage.rows_out = len(comments) + len(submissions) + len(prices)
 
 # Convert UTC to EST and extract date
 eastern = pytz.timezone('US/Eastern')
-comments['post_created_utc'] = pd.to_datetime(comments['post_created_utc'], unit='s', utc=True)
+comments['post_created_utc'] = to_utc(comments['post_created_utc'])
 comments['date_est'] = comments['post_created_utc'].dt.tz_convert(eastern).dt.date
 comments["date"] = comments["date_est"]
 submissions["date"] = pd.to_datetime(submissions["datetime_est"]).dt.date
-
-# Explode ticker mentions
-comment_ticker = comments.explode("tickers_mentioned")
-comment_ticker = comment_ticker[comment_ticker["tickers_mentioned"].notnull()]
-submission_ticker = submissions.explode("companies_mentioned")
-submission_ticker = submission_ticker[submission_ticker["companies_mentioned"].notnull()]
-
-# Rename
-comment_ticker = comment_ticker.rename(columns={"tickers_mentioned": "ticker", "consensus_score": "consensus"})
-submission_ticker = submission_ticker.rename(columns={"companies_mentioned": "ticker", "consensus_score": "consensus"})
-
-# Sentiment mapping
-sentiment_mapping = {"positive": 1, "neutral": 0, "negative": -1}
-comment_ticker["consensus_numeric"] = comment_ticker["consensus"].map(sentiment_mapping)
-submission_ticker["consensus_numeric"] = submission_ticker["consensus"].map(sentiment_mapping)
-comment_ticker["score"] = comment_ticker["comment_score"]
-
-# Combine and enrich
-combined = pd.concat([
-    comment_ticker[["date", "ticker", "consensus", "consensus_numeric", "score"]],
-    submission_ticker[["date", "ticker", "consensus", "consensus_numeric", "score", "num_comments", "link_flair_text"]]
-])
-
-combined["like_score_positive"] = combined.apply(
-    lambda row: row["score"] if row["consensus"] == "positive" else 0, axis=1
-)
-combined["like_score_negative"] = combined.apply(
-    lambda row: row["score"] if row["consensus"] == "negative" else 0, axis=1
-)
-
-# Aggregation
-def calc_sentiment_metrics(df):
-    grouped = df.groupby(["date", "ticker"])
-    result = grouped.agg(
-        no_positive_consensus=("consensus", lambda x: (x == "positive").sum()),
-        no_neutral_consensus=("consensus", lambda x: (x == "neutral").sum()),
-        no_negative_consensus=("consensus", lambda x: (x == "negative").sum()),
-        like_score_positive=("like_score_positive", "sum"),
-        like_score_negative=("like_score_negative", "sum"),
-        avg_num_comments=("num_comments", "mean"),
-        most_mentioned_link_flair_text=("link_flair_text", lambda x: x.mode().iloc[0] if not x.mode().empty else None),
-        number_of_mentions=("ticker", "count")
-    ).reset_index()
-
-    result["ticker_consensus_label"] = result.apply(
-        lambda row: "positive" if row["no_positive_consensus"] > row["no_negative_consensus"]
-        else "negative" if row["no_negative_consensus"] > row["no_positive_consensus"]
-        else "equal",
-        axis=1
-    )
-    return result
-
-ticker_sentiment = calc_sentiment_metrics(combined)
+if last_date is not None:
+    comments = comments[pd.to_datetime(comments["date"]) > last_date]
+    submissions = submissions[pd.to_datetime(submissions["date"]) > last_date]
+
+with metrics.stage("sentiment_metrics", rows_in=len(comments) + len(submissions)) as stage:
+    # Explode ticker mentions
+    comment_ticker = comments.explode("tickers_mentioned")
+    comment_ticker = comment_ticker[comment_ticker["tickers_mentioned"].notnull()]
+    submission_ticker = submissions.explode("companies_mentioned")
+    submission_ticker = submission_ticker[submission_ticker["companies_mentioned"].notnull()]
+
+    # Rename
+    comment_ticker = comment_ticker.rename(columns={"tickers_mentioned": "ticker", "consensus_score": "consensus"})
+    submission_ticker = submission_ticker.rename(columns={"companies_mentioned": "ticker", "consensus_score": "consensus"})
+
+    # Sentiment mapping
+    comment_ticker["consensus_numeric"] = comment_ticker["consensus"].map(sentiment_mapping)
+    submission_ticker["consensus_numeric"] = submission_ticker["consensus"].map(sentiment_mapping)
+    comment_ticker["score"] = comment_ticker["comment_score"]
+
+    # Combine and enrich
+    comment_columns = ["date", "ticker", "consensus", "consensus_numeric", "score"] + (["weight"] if weight_duplicates else [])
+    combined = pd.concat([
+        comment_ticker[comment_columns],
+        submission_ticker[["date", "ticker", "consensus", "consensus_numeric", "score", "num_comments", "link_flair_text"]]
+    ])
+    combined = add_like_scores(combined)
+
+    # Aggregation (vectorized, see sentiment_features.py)
+    ticker_sentiment = calc_sentiment_metrics(combined)
+    stage.rows_out = len(ticker_sentiment)
 
 # General sentiment
-comments_general = comments[comments["tickers_mentioned"].apply(lambda x: isinstance(x, list) and len(x) == 0)]
-submissions_general = submissions[submissions["companies_mentioned"].apply(lambda x: isinstance(x, list) and len(x) == 0)]
-combined_general = pd.concat([
-    comments_general[["date", "consensus_score"]],
-    submissions_general[["date", "consensus_score"]]
-]).rename(columns={"consensus_score": "consensus"})
-
-general_sentiment = combined_general.groupby("date").agg(
-    no_positive_consensus_general=("consensus", lambda x: (x == "positive").sum()),
-    no_neutral_consensus_general=("consensus", lambda x: (x == "neutral").sum()),
-    no_negative_consensus_general=("consensus", lambda x: (x == "negative").sum())
-).reset_index()
-
-general_sentiment["general_consensus_label"] = general_sentiment.apply(
-    lambda row: "positive" if row["no_positive_consensus_general"] > row["no_negative_consensus_general"]
-    else "negative" if row["no_negative_consensus_general"] > row["no_positive_consensus_general"]
-    else "equal",
-    axis=1
-)
+with metrics.stage("general_sentiment", rows_in=len(comments) + len(submissions)) as stage:
+    general_sentiment = calc_general_sentiment(comments, submissions)
+    stage.rows_out = len(general_sentiment)
 
 # Merge ticker + general sentiment
 features = ticker_sentiment.merge(general_sentiment, on="date", how="left")
 
-# Reshape market data to long format
-volume = volume.melt(id_vars=["Date"], var_name="ticker", value_name="volume")
-closing_price = closing_price.melt(id_vars=["Date"], var_name="ticker", value_name="closing_price")
-
-# Normalize dates for safe merging
-closing_price["Date"] = pd.to_datetime(closing_price["Date"]).dt.normalize()
-volume["Date"] = pd.to_datetime(volume["Date"]).dt.normalize()
-
-# Merge price and volume
-market = closing_price.merge(volume, on=["Date", "ticker"], how="outer")
-
-# Get valid trading days (timezone-aware → timezone-naive)
-nyse = mcal.get_calendar('NYSE')
-valid_trading_days = nyse.valid_days(
-    start_date=market["Date"].min().strftime('%Y-%m-%d'),  # FIXED here
-    end_date=market["Date"].max().strftime('%Y-%m-%d')     # FIXED here
-)
-valid_trading_days = valid_trading_days.tz_convert(None).normalize()
-
-# Normalize and rename market date column
-market["Date"] = pd.to_datetime(market["Date"]).dt.normalize()
-market = market[market["Date"].isin(valid_trading_days)]
-market = market.rename(columns={"Date": "date"})
-
-# Create full date × ticker panel
-all_dates = valid_trading_days
-all_tickers = market["ticker"].unique()
-full_index = pd.MultiIndex.from_product([all_dates, all_tickers], names=["date", "ticker"])
-market = market.set_index(["date", "ticker"]).reindex(full_index).reset_index()
-
-# Forward-fill price and volume
-market = market.sort_values(by=["ticker", "date"])
-market[["closing_price", "volume"]] = market.groupby("ticker")[["closing_price", "volume"]].ffill()
-
-# Compute target
-market["closing_price_next_day"] = market.groupby("ticker")["closing_price"].shift(-1)
-market["target"] = (market["closing_price_next_day"] > market["closing_price"]).astype(int)
-
-# Merge market data with sentiment features
-features["date"] = pd.to_datetime(features["date"])
-final = market.merge(features, on=["date", "ticker"], how="left")
-
-# Fill missing sentiment data with 0 or neutral
-sentiment_cols = [
-    "no_positive_consensus", "no_neutral_consensus", "no_negative_consensus",
-    "like_score_positive", "like_score_negative", "avg_num_comments",
-    "number_of_mentions", "no_positive_consensus_general", "no_neutral_consensus_general",
-    "no_negative_consensus_general"
-]
-final[sentiment_cols] = final[sentiment_cols].fillna(0)
-final["ticker_consensus_label"] = final["ticker_consensus_label"].fillna("equal")
-final["general_consensus_label"] = final["general_consensus_label"].fillna("equal")
-
-# Export
-final.to_csv("final_stock_sentiment_dataset2.csv", index=False)
-print("✅ Final dataset saved as 'final_stock_sentiment_dataset2.csv'.")
\ No newline at end of file
+# Build the date × ticker panel with prices, volume, target and sentiment features
+market = prices.rename(columns={"date": "Date"})
+
+with metrics.stage("panel", rows_in=len(market)) as stage:
+    if last_date is None and compact_panel:
+        # Sentiment is only stored for ticker-days with mentions; load_panel gives the dense view
+        final = build_compact_panel(market, features)
+        final_path = final.save(panel_name, fmt=output_format)
+        stage.rows_out = len(final)
+        stage.extra["panel_mb"] = final.memory_mb()
+        print(f"✅ Compact dataset saved as '{final_path}' ({len(final.mentions)} ticker-days with mentions).")
+    elif last_date is None:
+        final = build_panel(market, features)
+        final_path = write_table(final, panel_name, fmt=output_format, partition_on="date")
+        stage.rows_out = len(final)
+        print(f"✅ Final dataset saved as '{final_path}'.")
+    else:
+        # Only the last saved day is reloaded: it gets its next-day close and target
+        # and seeds the forward-fill of the new days
+        panel_tail = load_panel(panel_name, start_date=last_date, end_date=last_date + pd.Timedelta(days=1))
+        panel_tail, new_rows = append_days(panel_tail, market, features)
+        stage.rows_out = len(new_rows)
+        if new_rows.empty:
+            print(f"✅ No new trading days after {last_date.date()}.")
+        elif compact_panel:
+            final_path = CompactPanel.from_dense(pd.concat([panel_tail, new_rows], ignore_index=True)).save(
+                panel_name, fmt=output_format, append=True)
+            print(f"✅ Appended {new_rows['date'].nunique()} trading days to '{final_path}'.")
+        else:
+            final_path = append_table(pd.concat([panel_tail, new_rows], ignore_index=True), panel_name,
+                                      fmt=output_format, partition_on="date", sort_by=["ticker", "date"])
+            print(f"✅ Appended {new_rows['date'].nunique()} trading days to '{final_path}'.")
+
+metrics.finish()
@@ -0,0 +1,331 @@
+import asyncio
+import json
+import random
+import time
+import datetime as dt
+import aiohttp
+from pytz import timezone
+from crawl_store import est_date
+from instrumentation import current
+
+BASE_URL = "https://arctic-shift.photon-reddit.com"
+SUBMISSION_PATH = "/api/posts/search"
+COMMENT_PATH = "/api/comments/search"
+MAX_TOTAL_COMMENTS = 5000
+
+eastern = timezone("US/Eastern")
+
+def daterange(start_date_str, end_date_str):
+    start_dt = dt.datetime.strptime(start_date_str, "%Y-%m-%d")
+    end_dt = dt.datetime.strptime(end_date_str, "%Y-%m-%d")
+    for n in range(int((end_dt - start_dt).days)):
+        yield (start_dt + dt.timedelta(n)).strftime("%Y-%m-%d")
+
+def is_daily_thread(post):
+    return "daily discussion thread" in post.get("title", "").lower()
+
+def to_utc_string(date, days=0):
+    # "YYYY-MM-DD" in NY time (+ days) -> UTC string used by the API
+    return (
+        eastern.localize(dt.datetime.strptime(date, "%Y-%m-%d") + dt.timedelta(days=days))
+        .astimezone(dt.timezone.utc)
+        .strftime("%Y-%m-%d %H:%M:%S")
+    )
+
+# --- Token bucket rate limiter ---
+class TokenBucket:
+    def __init__(self, rate, capacity=1):
+        self.rate = rate          # tokens added per second
+        self.capacity = capacity  # max burst
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ArcticShiftClient:
+    # Usage:
+    #   async with ArcticShiftClient() as client:
+    #       posts = await client.fetch_all_posts("wallstreetbets", start_date, end_date)
+    def __init__(self, base_url=BASE_URL, requests_per_second=2.0, burst=4,
+                 max_concurrency=4, max_retries=5, backoff=2.0, record_path=None,
+                 max_comments_per_thread=MAX_TOTAL_COMMENTS):
+        self.base_url = base_url.rstrip("/")
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.record_path = record_path  # write every page to JSONL for replay_server.py
+        self.max_comments_per_thread = max_comments_per_thread
+        self.session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        self.session = aiohttp.ClientSession(connector=connector)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def get(self, path, params):
+        # Returns the "data" list of a page, or None if every retry failed
+        params = {k: str(v) for k, v in params.items()}
+        latencies = []  # per attempt, without the rate limiter's wait
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                async with self.session.get(self.base_url + path, params=params) as response:
+                    if response.status == 200:
+                        payload = await response.json(content_type=None)
+                        latencies.append(time.perf_counter() - start)
+                        self._record_call(path, latencies, ok=True)
+                        if self.record_path:
+                            self._record(path, params, payload)
+                        return payload.get("data", [])
+                    error = f"{response.status}: {await response.text()}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = repr(e)
+            latencies.append(time.perf_counter() - start)
+
+            if attempt < self.max_retries:
+                delay = self.backoff * 2 ** attempt + random.uniform(0, 1)
+                print(f"⚠️ {path} failed ({error[:200]}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        print("Error:", error)
+        self._record_call(path, latencies, ok=False)
+        return None
+
+    @staticmethod
+    def _record_call(path, latencies, ok):
+        run = current()
+        if run:
+            run.record_call(f"arcticshift {path}", latencies, ok=ok)
+
+    def _record(self, path, params, payload):
+        with open(self.record_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"path": path, "params": params, "response": payload}) + "\n")
+
+    # --- Submissions ---
+    async def fetch_all_posts(self, subreddit, start_date, end_date, store=None):
+        # With a CrawlStore every page goes to disk and the crawl resumes from the
+        # saved cursor; only the newly fetched posts are returned. The store
+        # remembers where its crawl started: a rerun with an earlier start_date
+        # first fetches the part before that, then resumes from the cursor.
+        after_timestamp = to_utc_string(start_date)
+        before_timestamp = to_utc_string(end_date)
+        crawled_from = store.posts_from() if store else None
+        crawled_to = store.state["posts_after"] if store else None
+
+        print("🔄 Fetching posts incrementally...")
+        if crawled_from is None or after_timestamp > crawled_to:
+            # Nothing crawled yet, or only before this range: a new crawl starting here
+            if store:
+                store.start_posts(after_timestamp)
+            return (await self._fetch_posts(subreddit, after_timestamp, before_timestamp, store))[0]
+
+        all_posts = []
+        if after_timestamp < crawled_from:
+            # Earlier part first; the store's start only moves back once all of it is fetched
+            gap_end = min(crawled_from, before_timestamp)
+            posts, complete = await self._fetch_posts(subreddit, after_timestamp, gap_end, store, move_cursor=False)
+            all_posts += posts
+            if complete and gap_end == crawled_from:
+                store.start_posts(after_timestamp)
+        if crawled_to < before_timestamp:
+            all_posts += (await self._fetch_posts(subreddit, max(after_timestamp, crawled_to), before_timestamp, store))[0]
+        return all_posts
+
+    async def _fetch_posts(self, subreddit, after_timestamp, before_timestamp, store=None, move_cursor=True):
+        # Posts in (after_timestamp, before_timestamp), page by page; returns
+        # (posts, False if a page failed)
+        all_posts = []
+        while True:
+            params = {
+                "subreddit": subreddit,
+                "after": after_timestamp,
+                "before": before_timestamp,
+                "limit": "auto",
+                "sort": "asc",
+                "sort_type": "created_utc"
+            }
+            data = await self.get(SUBMISSION_PATH, params)
+            if not data:
+                return all_posts, data is not None
+
+            all_posts.extend(data)
+            print(f"  → Total posts collected: {len(all_posts)}")
+
+            last_utc = data[-1]["created_utc"]
+            last_dt = dt.datetime.fromtimestamp(last_utc, tz=dt.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            if store:
+                store.append_posts(data, last_dt if move_cursor else None)
+            if last_dt >= before_timestamp or last_dt == after_timestamp:
+                break
+            after_timestamp = last_dt
+
+        return all_posts, True
+
+    # --- Daily discussion threads ---
+    async def get_daily_thread_post_id(self, subreddit, date):
+        params = {
+            "subreddit": subreddit,
+            "after": to_utc_string(date),
+            "before": to_utc_string(date, days=1),
+            "limit": 100,
+            "sort": "asc",
+            "author": "wsbapp",
+        }
+        for post in await self.get(SUBMISSION_PATH, params) or []:
+            if is_daily_thread(post):
+                return post["id"]
+        return None
+
+    async def fetch_daily_thread_index(self, subreddit, start_date, end_date):
+        # One paginated search over all wsbapp posts in [start_date, end_date)
+        # instead of one search per day. Returns {date: post_id or None} for every
+        # date the scan fully covered; if a page fails, later dates are left out.
+        index = {}
+        after_timestamp = to_utc_string(start_date)
+        before_timestamp = to_utc_string(end_date)
+        covered_until = end_date
+        last_created = None
+
+        print("🔄 Building daily thread index...")
+
+        while True:
+            params = {
+                "subreddit": subreddit,
+                "author": "wsbapp",
+                "after": after_timestamp,
+                "before": before_timestamp,
+                "limit": "auto",
+                "sort": "asc",
+                "sort_type": "created_utc"
+            }
+            data = await self.get(SUBMISSION_PATH, params)
+            if data is None:
+                # Only days before the last post we saw are complete
+                covered_until = est_date(last_created) if last_created else start_date
+                break
+            if not data:
+                break
+
+            for post in data:
+                if is_daily_thread(post):
+                    index.setdefault(est_date(post["created_utc"]), post["id"])
+
+            last_created = data[-1]["created_utc"]
+            last_dt = dt.datetime.fromtimestamp(last_created, tz=dt.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+            if last_dt >= before_timestamp or last_dt == after_timestamp:
+                break
+            after_timestamp = last_dt
+
+        dates = list(daterange(start_date, covered_until))
+        print(f"  → Found {len(index)} daily threads in {len(dates)} days")
+        return {date: index.get(date) for date in dates}
+
+    async def resolve_daily_threads(self, subreddit, dates, store=None):
+        # date -> post_id from the on-disk index; the bulk scan only covers dates
+        # missing from it, and per-day lookups only fill what the scan could not
+        index = dict(store.thread_index) if store else {}
+        missing = sorted(d for d in dates if d not in index)
+        if missing:
+            end = (dt.datetime.strptime(missing[-1], "%Y-%m-%d") + dt.timedelta(days=1)).strftime("%Y-%m-%d")
+            scanned = await self.fetch_daily_thread_index(subreddit, missing[0], end)
+            index.update(scanned)
+            gaps = [d for d in missing if d not in index]
+            post_ids = await asyncio.gather(*(self.get_daily_thread_post_id(subreddit, d) for d in gaps))
+            # Per-day lookups can't tell "no thread" from a failed request, so
+            # only found threads are remembered
+            index.update({d: post_id for d, post_id in zip(gaps, post_ids) if post_id})
+            if store:
+                # Today's thread may not be posted yet, so don't remember it as missing
+                today = dt.datetime.now(eastern).strftime("%Y-%m-%d")
+                store.update_thread_index({
+                    d: index[d] for d in missing
+                    if d in index and (index[d] or d < today)
+                })
+        return {date: index.get(date) for date in dates}
+
+    # --- Comments ---
+    async def fetch_comments_for_post(self, post_id, store=None, date=None):
+        # With a store, date (the thread's day) is needed: progress is kept per day
+        all_comments = []
+        after = None
+        count = 0
+        if store:
+            if date is None:
+                raise ValueError("fetch_comments_for_post needs the thread's date when a store is given")
+            if store.thread_state(date) is None:
+                store.start_thread(date, post_id)
+            thread = store.thread_state(date)
+            after, count = thread["after"], thread["count"]
+        print(f"🔄 Fetching comments for post: {post_id}")
+
+        while True:
+            params = {
+                "link_id": f"t3_{post_id}",
+                "limit": "auto",
+                "sort": "asc",
+                "sort_type": "created_utc"
+            }
+            if after:
+                params["after"] = after
+
+            data = await self.get(COMMENT_PATH, params)
+            if data is None:
+                # Request failed - leave the thread unfinished so a rerun resumes it
+                break
+
+            all_comments.extend(data)
+            count += len(data)
+            print(f"  → Total comments collected: {count}")
+
+            done = not data or len(data) < 100 or count >= self.max_comments_per_thread
+            if data:
+                after = data[-1]["created_utc"]
+            if store:
+                store.append_comments(date, post_id, data, after, done=done)
+
+            if count >= self.max_comments_per_thread:
+                print(f"🚫 Reached max of {self.max_comments_per_thread} comments for post {post_id}")
+            if done:
+                break
+
+        return all_comments
+
+    async def fetch_daily_thread_comments(self, subreddit, dates, store=None):
+        # Crawl several daily threads at once; returns comments in date order.
+        # With a CrawlStore, finished days are skipped and unfinished ones resumed.
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        thread_ids = await self.resolve_daily_threads(subreddit, dates, store=store)
+
+        async def crawl_day(date):
+            async with semaphore:
+                thread = store.thread_state(date) if store else None
+                if thread and thread["done"]:
+                    return []
+                if thread:
+                    post_id = thread["post_id"]
+                else:
+                    post_id = thread_ids[date]
+                    if not post_id:
+                        print(f"❌ No Daily Thread found for {date}")
+                        return []
+                    if store:
+                        store.start_thread(date, post_id)
+                return await self.fetch_comments_for_post(post_id, store=store, date=date)
+
+        results = await asyncio.gather(*(crawl_day(date) for date in dates))
+        return [comment for comments in results for comment in comments]
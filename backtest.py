@@ -0,0 +1,233 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.model_selection import ParameterGrid
+from storage import OUTPUT_FORMAT, write_table
+
+# Walk-forward backtest of the classical models in 5. ML-models.ipynb. The panel
+# is one-hot encoded once into a FeatureMatrix; every (model, fold, parameter
+# combination) is fitted in a process pool that receives the matrix once per
+# worker. Within a task the model's "warm" parameter is walked in increasing
+# order and the fit is reused where the estimator allows it (more trees on a
+# warm-started forest, more boosting rounds on the same booster, a new k for
+# KNN without refitting). All test-day predictions go into one table.
+
+numeric_features = [
+    "no_positive_consensus",
+    "no_neutral_consensus",
+    "no_negative_consensus",
+    "like_score_positive",
+    "like_score_negative",
+    "avg_num_comments",
+    "number_of_mentions",
+    "no_positive_consensus_general",
+    "no_neutral_consensus_general",
+    "no_negative_consensus_general",
+    "closing_price"
+]
+
+categorical_features = [
+    "most_mentioned_link_flair_text",
+    "ticker_consensus_label",
+    "general_consensus_label"
+]
+
+# --- Features ---
+class FeatureMatrix:
+    def __init__(self, X, y, columns, index, dates, tickers):
+        self.X = X
+        self.y = y
+        self.columns = columns
+        self.index = index
+        self.dates = dates
+        self.tickers = tickers
+
+    @classmethod
+    def from_panel(cls, panel):
+        # Same encoding as the notebook: numeric features + get_dummies(drop_first=True),
+        # rows with missing values dropped
+        panel = panel.assign(
+            avg_num_comments=panel["avg_num_comments"].fillna(0),
+            most_mentioned_link_flair_text=panel["most_mentioned_link_flair_text"].fillna("unknown"),
+        )
+        encoded = pd.get_dummies(panel[categorical_features], drop_first=True)
+        X = pd.concat([panel[numeric_features], encoded], axis=1).dropna()
+        rows = panel.loc[X.index]
+        return cls(
+            X.to_numpy(dtype=np.float64), rows["target"].to_numpy(), list(X.columns), X.index,
+            pd.to_datetime(rows["date"]).to_numpy(), rows["ticker"].to_numpy()
+        )
+
+    def frame(self):
+        return pd.DataFrame(self.X, index=self.index, columns=self.columns)
+
+# --- Folds ---
+def walk_forward_folds(dates, first_test="2025-01-01", test_days=21, mode="expanding", train_days=None, purge_days=1):
+    # Consecutive blocks of test_days trading days from first_test on. Training
+    # uses every earlier day ("expanding") or the last train_days ("rolling").
+    # The target of a day is the next day's move, so the last purge_days days
+    # before a test block are left out of its training set (their targets use
+    # the test block's closes).
+    if mode not in ("expanding", "rolling"):
+        raise ValueError(f"mode must be 'expanding' or 'rolling', not {mode!r}")
+    if mode == "rolling" and not train_days:
+        raise ValueError("mode='rolling' needs train_days")
+    days = np.unique(dates)
+    start = np.searchsorted(days, np.datetime64(pd.Timestamp(first_test)))
+    folds = []
+    for i in range(start, len(days), test_days):
+        test = days[i:i + test_days]
+        end = max(0, i - purge_days)
+        train = days[:end] if mode == "expanding" else days[max(0, end - train_days):end]
+        folds.append((np.flatnonzero(np.isin(dates, train)), np.flatnonzero(np.isin(dates, test))))
+    return folds
+
+# --- Models ---
+def default_models():
+    # grid: hyperparameters; warm: (parameter walked in one task, how the fit is reused)
+    #   "warm_start"   - refit with warm_start=True (forests only grow the extra trees)
+    #   "boosting"     - continue the previous booster with the extra rounds (XGBoost)
+    #   "predict_time" - parameter only used at predict time, fit once (KNN's k)
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.neighbors import KNeighborsClassifier
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    models = {
+        "logistic_regression": {
+            "estimator": LogisticRegression(max_iter=1000),
+            "grid": {"C": [0.01, 0.1, 1.0, 10.0]},
+            "warm": None,  # a warm-started lbfgs stops at a slightly different optimum
+        },
+        "knn": {
+            "estimator": Pipeline([("scaler", StandardScaler()), ("knn", KNeighborsClassifier())]),
+            "grid": {"knn__n_neighbors": list(range(2, 26))},
+            "warm": ("knn__n_neighbors", "predict_time"),
+        },
+        "random_forest": {
+            "estimator": RandomForestClassifier(random_state=42),
+            "grid": {"n_estimators": [50, 100, 150, 200, 300, 400, 500], "max_depth": [None, 10, 20]},
+            "warm": ("n_estimators", "warm_start"),
+        },
+    }
+    try:
+        from xgboost import XGBClassifier
+    except ImportError:
+        print("⚠️ xgboost is not installed, skipping XGBoost")
+        return models
+    models["xgboost"] = {
+        "estimator": XGBClassifier(eval_metric="logloss", random_state=42),
+        "grid": {
+            "n_estimators": [50, 100, 200, 300, 500, 1000, 2000, 3000],
+            "max_depth": [2, 3, 4, 5, 7, 10],
+            "learning_rate": [0.01, 0.05, 0.1, 0.2, 0.3],
+        },
+        "warm": ("n_estimators", "boosting"),
+    }
+    return models
+
+# --- Worker processes ---
+_matrix = None
+_folds = None
+_models = None
+
+def _init_worker(matrix, folds, models):
+    global _matrix, _folds, _models
+    _matrix, _folds, _models = matrix, folds, models
+
+def _run_task(name, fold, params):
+    spec = _models[name]
+    train, test = _folds[fold]
+    X_train, y_train, X_test = _matrix.X[train], _matrix.y[train], _matrix.X[test]
+    warm_param, mode = spec.get("warm") or (None, None)
+    values = sorted(spec["grid"][warm_param]) if warm_param else [None]
+
+    model = clone(spec["estimator"]).set_params(**params)
+    preds, probas, labels = [], [], []
+    done = 0
+    for value in values:
+        if mode == "boosting":
+            booster = model.get_booster() if done else None
+            model.set_params(**{warm_param: value - done})
+            model.fit(X_train, y_train, xgb_model=booster)
+            done = value
+        elif mode == "predict_time":
+            model.set_params(**{warm_param: value})
+            if not done:
+                model.fit(X_train, y_train)
+                done = 1
+        else:
+            if warm_param:
+                model.set_params(**{warm_param: value})
+            if mode == "warm_start":
+                model.set_params(warm_start=True)
+            model.fit(X_train, y_train)
+
+        preds.append(model.predict(X_test))
+        probas.append(model.predict_proba(X_test)[:, 1] if hasattr(model, "predict_proba") else np.full(len(test), np.nan))
+        labels.append(json.dumps({**params, warm_param: value} if warm_param else params, sort_keys=True, default=str))
+    return name, fold, labels, preds, probas
+
+# --- Engine ---
+def task_list(models, n_folds):
+    tasks = []
+    for name, spec in models.items():
+        warm_param = (spec.get("warm") or (None, None))[0]
+        grid = {k: v for k, v in spec["grid"].items() if k != warm_param}
+        for params in ParameterGrid(grid):
+            for fold in range(n_folds):
+                tasks.append((name, fold, params))
+    return tasks
+
+def run_backtest(panel, models=None, folds=None, workers=None, name="backtest_results", fmt=OUTPUT_FORMAT, **fold_args):
+    # Returns (and writes) one row per model x parameters x test row
+    matrix = panel if isinstance(panel, FeatureMatrix) else FeatureMatrix.from_panel(panel)
+    models = models or default_models()
+    folds = folds or walk_forward_folds(matrix.dates, **fold_args)
+    tasks = task_list(models, len(folds))
+    workers = workers or os.cpu_count() or 1
+    print(f"🔄 {len(tasks)} tasks ({len(models)} models x {len(folds)} folds x parameter grids) on {workers} processes")
+
+    if workers == 1:
+        _init_worker(matrix, folds, models)
+        outputs = [_run_task(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(matrix, folds, models)) as pool:
+            outputs = list(pool.map(_run_task, *zip(*tasks)))
+
+    parts = []
+    for model_name, fold, labels, preds, probas in outputs:
+        test = folds[fold][1]
+        for label, pred, proba in zip(labels, preds, probas):
+            parts.append(pd.DataFrame({
+                "model": model_name,
+                "params": label,
+                "fold": fold,
+                "date": matrix.dates[test],
+                "ticker": matrix.tickers[test],
+                "y_true": matrix.y[test],
+                "y_pred": pred,
+                "y_proba": proba,
+            }))
+    results = pd.concat(parts, ignore_index=True)
+    if name:
+        path = write_table(results, name, fmt=fmt)
+        print(f"✅ Saved {len(results)} predictions to {path}")
+    return results
+
+def summarize(results):
+    # Accuracy per fold, then mean/std over folds for every model and parameter set
+    per_fold = (
+        results.assign(correct=results["y_true"] == results["y_pred"])
+        .groupby(["model", "params", "fold"])["correct"].mean()
+        .rename("accuracy").reset_index()
+    )
+    return (
+        per_fold.groupby(["model", "params"])["accuracy"].agg(["mean", "std", "count"])
+        .rename(columns={"count": "folds"})
+        .sort_values("mean", ascending=False).reset_index()
+    )
@@ -0,0 +1,249 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from pytz import timezone as pytz_timezone
+import synthetic_data
+from comment_pipeline import CommentPipeline
+from enrichment import enrich_comments, enrich_submissions
+from near_duplicates import NearDuplicateFilter
+from panel import build_compact_panel, build_panel, sentiment_cols
+from sentiment_features import add_like_scores, calc_general_sentiment, calc_sentiment_metrics, sentiment_mapping
+from sequences import WindowedPanel
+from ticker_matcher import TickerMatcher, load_company_dict
+
+# Benchmarks of the pipeline's hot stages on synthetic data (synthetic_data.py):
+#   python benchmark.py small                      -> benchmark_small.json
+#   python benchmark.py 1000000 500 medium.json    (comments, tickers, report)
+#   python benchmark.py compare old.json new.json  (exit code 1 on a regression)
+# Every stage runs `repeat` times on the same input; the report holds all run
+# times, the median, rows in/out and rows per second, plus the git commit and
+# machine, so reports from two versions can be compared stage by stage.
+
+scales = {
+    "small": {"comments": 10_000, "tickers": 92, "posts": 500, "days": 60},
+    "medium": {"comments": 1_000_000, "tickers": 1000, "posts": 20_000, "days": 250},
+    "large": {"comments": 10_000_000, "tickers": 3000, "posts": 100_000, "days": 500},
+}
+sequence_windows = [4, 10, 30]
+
+def git_version():
+    repo = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repo,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+def machine():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+    }
+
+def scale_config(scale=None, comments=None, tickers=None):
+    # Named scale, with comments/tickers overriding it; posts and days grow with the comments
+    config = dict(scales[scale or "small"])
+    if comments:
+        config.update(comments=int(comments), posts=max(100, int(comments) // 50))
+    if tickers:
+        config["tickers"] = int(tickers)
+    return config
+
+def time_stage(func, repeat, untimed=None):
+    # Returns (result of the last run, seconds of every run); untimed() gives
+    # the seconds of the last run spent generating input, which are left out
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - start - (untimed() if untimed else 0))
+    return result, runs
+
+class TimedPages:
+    # Iterates a page generator, adding up the time spent inside the generator
+    def __init__(self, pages):
+        self.pages = iter(pages)
+        self.seconds = 0.0
+
+    def __iter__(self):
+        while True:
+            start = time.perf_counter()
+            page = next(self.pages, None)
+            self.seconds += time.perf_counter() - start
+            if page is None:
+                return
+            yield page
+
+def stage_report(runs, rows_in, rows_out):
+    median = statistics.median(runs)
+    return {
+        "seconds": median,
+        "min_seconds": min(runs),
+        "runs": runs,
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "rows_per_sec": rows_in / median if median else None,
+    }
+
+# --- Stages ---
+def run_benchmarks(config, repeat=3, seed=42, workers=1, stages=None):
+    # stages: names to run (default all); later stages use the output of earlier ones
+    # but generated inputs are never timed
+    eastern = pytz_timezone("US/Eastern")
+    report = {}
+    wanted = set(stages) if stages else None
+
+    def run(name, func, rows_in, rows_out=len, untimed=None):
+        if wanted is not None and name not in wanted:
+            return func()
+        result, runs = time_stage(func, repeat, untimed)
+        report[name] = stage_report(runs, rows_in, rows_out(result))
+        print(f"✅ {name}: {report[name]['seconds']:.3f}s ({report[name]['rows_per_sec'] or 0:,.0f} rows/sec)")
+        return result
+
+    print(f"🔄 Generating {config['comments']:,} comments, {config['posts']:,} posts and {config['tickers']} tickers")
+    companies = synthetic_data.make_companies(config["tickers"], seed)
+    posts = synthetic_data.make_submissions(config["posts"], companies, days=config["days"], seed=seed)
+
+    # find_companies: company list -> matcher, then submissions and the top comments
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "russel_3000.csv")
+        companies.to_csv(csv_path, sep=";", index=False)
+        company_dict = load_company_dict(csv_path)
+    matcher = run("build_matcher", lambda: TickerMatcher(company_dict), len(company_dict), lambda m: len(m.order))
+
+    # Comment filtering and top-200 per thread. Every run streams freshly generated
+    # pages (the same ones, same seed), so the comments never sit in memory at
+    # once; the time spent generating them is left out of the timing.
+    stream = {}
+
+    def feed(pipeline):
+        stream["pages"] = TimedPages(synthetic_data.comment_pages(config["comments"], posts, companies, seed=seed))
+        return pipeline.feed(c for page in stream["pages"] for c in page).results()
+
+    def generating():
+        return stream["pages"].seconds
+
+    top_comments = run("comment_pipeline", lambda: feed(CommentPipeline(top_k=200)), config["comments"],
+                       untimed=generating)
+    run("comment_pipeline_dedup", lambda: feed(CommentPipeline(top_k=200, dedup=NearDuplicateFilter())),
+        config["comments"], untimed=generating)
+
+    submission_df = pd.DataFrame(posts)
+    run("find_companies_submissions", lambda: enrich_submissions(submission_df.copy(), matcher, workers=workers), len(posts))
+    lookup = {p["id"]: {"title": p["title"], "created_utc": p["created_utc"]} for p in posts}
+    run("find_companies_comments", lambda: enrich_comments(top_comments, lookup, matcher, eastern, workers=workers),
+        len(top_comments))
+
+    # Sentiment aggregation as in 3. MakeDataFile.py
+    comments = synthetic_data.make_scored_comments(config["comments"], companies, days=config["days"], seed=seed)
+    submissions = synthetic_data.make_scored_submissions(config["posts"], companies, days=config["days"], seed=seed)
+    comments["date"] = comments["post_created_utc"].dt.tz_convert(eastern).dt.date
+    submissions["date"] = pd.to_datetime(submissions["datetime_est"]).dt.date
+    features = run("sentiment_metrics", lambda: sentiment_metrics(comments, submissions), len(comments) + len(submissions))
+
+    # Date x ticker panel
+    market = synthetic_data.make_prices(companies["Ticker"], days=config["days"], seed=seed).rename(columns={"date": "Date"})
+    panel = run("build_panel", lambda: build_panel(market, features), len(market))
+    if wanted is None or "build_compact_panel" in wanted:
+        # Same panel with sentiment only for mentioned ticker-days; memory of both kept in the report
+        compact = run("build_compact_panel", lambda: build_compact_panel(market, features), len(market))
+        report["build_compact_panel"]["memory_mb"] = compact.memory_mb()
+        report["build_compact_panel"]["dense_memory_mb"] = panel.memory_usage(deep=True).sum() / 1e6
+
+    # LSTM windows: build the cube, then gather every window once in batches
+    X = panel[sentiment_cols + ["closing_price"]].fillna(0).to_numpy()
+    for window in sequence_windows:
+        run(f"sequences_w{window}", lambda: gather_windows(panel, X, window), len(panel), rows_out=lambda n: n)
+    return report
+
+def sentiment_metrics(comments, submissions):
+    comment_ticker = comments.explode("tickers_mentioned")
+    comment_ticker = comment_ticker[comment_ticker["tickers_mentioned"].notnull()]
+    submission_ticker = submissions.explode("companies_mentioned")
+    submission_ticker = submission_ticker[submission_ticker["companies_mentioned"].notnull()]
+    comment_ticker = comment_ticker.rename(columns={"tickers_mentioned": "ticker", "consensus_score": "consensus"})
+    submission_ticker = submission_ticker.rename(columns={"companies_mentioned": "ticker", "consensus_score": "consensus"})
+    comment_ticker["consensus_numeric"] = comment_ticker["consensus"].map(sentiment_mapping)
+    submission_ticker["consensus_numeric"] = submission_ticker["consensus"].map(sentiment_mapping)
+    comment_ticker["score"] = comment_ticker["comment_score"]
+
+    combined = pd.concat([
+        comment_ticker[["date", "ticker", "consensus", "consensus_numeric", "score"]],
+        submission_ticker[["date", "ticker", "consensus", "consensus_numeric", "score", "num_comments", "link_flair_text"]]
+    ])
+    ticker_sentiment = calc_sentiment_metrics(add_like_scores(combined))
+    general_sentiment = calc_general_sentiment(comments, submissions)
+    return ticker_sentiment.merge(general_sentiment, on="date", how="left")
+
+def gather_windows(panel, X, window, batch_size=256):
+    windowed = WindowedPanel(panel, X, panel["target"])
+    n = 0
+    for X_batch, _ in windowed.batches(window, batch_size=batch_size)():
+        n += len(X_batch)
+    return n
+
+# --- Reports ---
+def write_report(report, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+    return path
+
+def benchmark(scale="small", comments=None, tickers=None, repeat=3, seed=42, workers=1, stages=None, path=None):
+    config = scale_config(scale, comments, tickers)
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "version": git_version(),
+        "machine": machine(),
+        "config": {**config, "repeat": repeat, "seed": seed, "workers": workers},
+        "stages": run_benchmarks(config, repeat, seed, workers, stages),
+    }
+    path = path or f"benchmark_{scale or config['comments']}.json"
+    write_report(report, path)
+    print(f"✅ Saved benchmark report to {path}")
+    return report
+
+def compare(baseline, current, tolerance=0.2):
+    # Stages whose median time grew by more than `tolerance` (0.2 = 20%)
+    regressions = {}
+    for name, stage in current["stages"].items():
+        old = baseline["stages"].get(name)
+        if not old or not old["seconds"]:
+            continue
+        ratio = stage["seconds"] / old["seconds"]
+        flag = "❌" if ratio > 1 + tolerance else "✅"
+        print(f"{flag} {name}: {old['seconds']:.3f}s -> {stage['seconds']:.3f}s ({ratio:.2f}x)")
+        if ratio > 1 + tolerance:
+            regressions[name] = ratio
+    if baseline.get("config") != current.get("config"):
+        print("⚠️ The reports were run with different configurations")
+    return regressions
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["compare"]:
+        with open(sys.argv[2], encoding="utf-8") as f:
+            old_report = json.load(f)
+        with open(sys.argv[3], encoding="utf-8") as f:
+            new_report = json.load(f)
+        sys.exit(1 if compare(old_report, new_report) else 0)
+
+    arg = sys.argv[1] if len(sys.argv) > 1 else "small"
+    if arg in scales:
+        benchmark(arg, path=sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        benchmark(None, comments=arg, tickers=sys.argv[2] if len(sys.argv) > 2 else None,
+                  path=sys.argv[3] if len(sys.argv) > 3 else None)
@@ -0,0 +1,112 @@
+import heapq
+import itertools
+from instrumentation import hot
+
+skip_starts = ("Thanks for your submission!",)
+skip_contains = ("**User Report**", "I am bot")
+
+def is_low_quality(comment):
+    # Bot messages and automated reports
+    body = comment.get("body", "")
+    return any(body.startswith(s) for s in skip_starts) or any(s in body for s in skip_contains)
+
+
+class CommentPipeline:
+    # Streams comments page by page: duplicates and bot comments are dropped as
+    # they arrive and every thread only keeps a heap of its top_k comments by
+    # score, so memory is threads x top_k instead of every comment fetched.
+    #
+    # Same result as deduplicating the full list with {c["id"]: c for c in ...}
+    # (the last copy of a comment wins but keeps its first position), grouping
+    # by link_id, filtering and taking sorted(..., reverse=True)[:top_k] per
+    # thread. Ties in score keep the comment that arrived first, like the stable
+    # sort did. One difference: when a later copy has a lower score, comments
+    # the heap dropped before are not brought back.
+    #
+    # With dedup (a near_duplicates.NearDuplicateFilter) near-identical bodies
+    # are dropped too; the kept representative gets cluster_size and
+    # cluster_score (summed over its cluster) in results().
+    def __init__(self, top_k=200, dedup=None, batch_size=1000):
+        self.top_k = top_k
+        self.dedup = dedup
+        self.batch_size = batch_size
+        self.cluster_of = {}  # comment id -> cluster id, for kept comments
+        self.seen = {}  # comment id -> (post_id, arrival) if it passed the filters, else None
+        self.heaps = {}  # post_id -> min-heap of (score, -arrival, comment)
+        self.arrival = itertools.count()
+        self.n_seen = 0
+        self.n_kept = 0
+
+    def add(self, comment, prepared=None):
+        self.n_seen += 1
+        if comment["id"] in self.seen:
+            self.replace(comment)
+            return
+        self.seen[comment["id"]] = None
+
+        post_id = comment.get("link_id", "").replace("t3_", "")
+        if not post_id:
+            return
+        # Register the thread even if this comment is filtered, so threads come
+        # out in order of their first comment
+        heap = self.heaps.setdefault(post_id, [])
+        if is_low_quality(comment):
+            return
+        if self.dedup is not None:
+            cluster, is_new = self.dedup.add(comment, prepared)
+            if not is_new:
+                return
+            self.cluster_of[comment["id"]] = cluster
+
+        self.n_kept += 1
+        arrival = next(self.arrival)
+        self.seen[comment["id"]] = (post_id, arrival)
+        self.push(heap, (comment.get("score", 0), -arrival, comment))
+
+    def push(self, heap, item):
+        if len(heap) < self.top_k:
+            heapq.heappush(heap, item)
+        elif item[:2] > heap[0][:2]:
+            heapq.heapreplace(heap, item)
+
+    def replace(self, comment):
+        # A later copy (re-fetched page) replaces the earlier one in its place
+        kept = self.seen[comment["id"]]
+        if kept is None:
+            return
+        post_id, arrival = kept
+        heap = self.heaps[post_id]
+        item = (comment.get("score", 0), -arrival, comment)
+        for i, old in enumerate(heap):
+            if old[1] == -arrival:
+                heap[i] = item
+                heapq.heapify(heap)
+                return
+        self.push(heap, item)
+
+    @hot
+    def feed(self, comments):
+        if self.dedup is None:
+            for comment in comments:
+                self.add(comment)
+            return self
+        # MinHash signatures are computed batch by batch
+        comments = iter(comments)
+        while True:
+            batch = list(itertools.islice(comments, self.batch_size))
+            if not batch:
+                return self
+            for comment, prepared in zip(batch, self.dedup.prepare(batch)):
+                self.add(comment, prepared)
+
+    def results(self):
+        top_comments = []
+        for heap in self.heaps.values():
+            top_comments.extend(c for _, _, c in sorted(heap, key=lambda item: item[:2], reverse=True))
+        if self.dedup is not None:
+            top_comments = [
+                {**c, "cluster_size": self.dedup.sizes[self.cluster_of[c["id"]]],
+                 "cluster_score": self.dedup.scores[self.cluster_of[c["id"]]]}
+                for c in top_comments
+            ]
+        return top_comments
@@ -0,0 +1,141 @@
+import json
+import os
+import datetime as dt
+from pytz import timezone
+
+eastern = timezone("US/Eastern")
+
+# On-disk layout (everything append-only except state.json):
+#   <root>/submissions/<YYYY-MM-DD>.jsonl          posts by NY-time creation date
+#   <root>/comments/<YYYY-MM-DD>_<post_id>.jsonl   comments of one daily thread
+#   <root>/state.json                              pagination cursors (posts: crawled from/until)
+#   <root>/daily_threads.json                      date -> daily thread id (null = none)
+# A page is written to its shard before the cursor moves past it, so after a
+# crash the worst case is one page fetched twice (duplicates are dropped on load).
+
+def est_date(created_utc):
+    return dt.datetime.fromtimestamp(created_utc, tz=dt.timezone.utc).astimezone(eastern).strftime("%Y-%m-%d")
+
+def read_jsonl(path):
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                # Partial last line from an interrupted write
+                continue
+    return records
+
+
+class CrawlStore:
+    def __init__(self, root="crawl_data"):
+        self.root = root
+        self.submission_dir = os.path.join(root, "submissions")
+        self.comment_dir = os.path.join(root, "comments")
+        self.state_path = os.path.join(root, "state.json")
+        self.thread_index_path = os.path.join(root, "daily_threads.json")
+        os.makedirs(self.submission_dir, exist_ok=True)
+        os.makedirs(self.comment_dir, exist_ok=True)
+
+        self.state = {"posts_after": None, "threads": {}}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding="utf-8") as f:
+                self.state.update(json.load(f))
+
+        self.thread_index = {}
+        if os.path.exists(self.thread_index_path):
+            with open(self.thread_index_path, encoding="utf-8") as f:
+                self.thread_index = json.load(f)
+
+    @staticmethod
+    def _write_json(path, obj):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def save_state(self):
+        self._write_json(self.state_path, self.state)
+
+    def update_thread_index(self, entries):
+        self.thread_index.update(entries)
+        self._write_json(self.thread_index_path, self.thread_index)
+
+    @staticmethod
+    def _append(path, records):
+        with open(path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    # --- Submissions ---
+    def posts_from(self):
+        # UTC timestamp the crawled posts start at (posts_from .. posts_after is
+        # complete); older state files only have the cursor, so the first
+        # shard's date is used
+        if self.state["posts_after"] is None:
+            return None
+        if self.state.get("posts_from"):
+            return self.state["posts_from"]
+        dates = sorted(name[:-len(".jsonl")] for name in os.listdir(self.submission_dir))
+        if not dates:
+            return None
+        start = eastern.localize(dt.datetime.strptime(dates[0], "%Y-%m-%d")).astimezone(dt.timezone.utc)
+        return start.strftime("%Y-%m-%d %H:%M:%S")
+
+    def start_posts(self, after_timestamp):
+        # A new crawled range starts here (the cursor moves to it on the first page)
+        if self.state["posts_after"] is None or after_timestamp > self.state["posts_after"]:
+            self.state["posts_after"] = after_timestamp
+        self.state["posts_from"] = after_timestamp
+        self.save_state()
+
+    def append_posts(self, posts, after_timestamp=None):
+        # after_timestamp: new cursor (None: pages of an earlier gap, cursor stays)
+        by_date = {}
+        for post in posts:
+            by_date.setdefault(est_date(post["created_utc"]), []).append(post)
+        for date, records in by_date.items():
+            self._append(os.path.join(self.submission_dir, f"{date}.jsonl"), records)
+        if after_timestamp is not None:
+            self.state["posts_after"] = after_timestamp
+        self.save_state()
+
+    def load_submissions(self, start_date, end_date):
+        posts = {}
+        for name in sorted(os.listdir(self.submission_dir)):
+            date = name[:-len(".jsonl")]
+            if start_date <= date < end_date:
+                for post in read_jsonl(os.path.join(self.submission_dir, name)):
+                    posts[post["id"]] = post
+        return sorted(posts.values(), key=lambda p: p["created_utc"])
+
+    # --- Daily thread comments ---
+    def thread_state(self, date):
+        # {"post_id": ..., "after": created_utc cursor, "count": n, "done": bool}
+        return self.state["threads"].get(date)
+
+    def start_thread(self, date, post_id):
+        self.state["threads"][date] = {"post_id": post_id, "after": None, "count": 0, "done": post_id is None}
+        self.save_state()
+
+    def append_comments(self, date, post_id, comments, after, done=False):
+        if comments:
+            self._append(os.path.join(self.comment_dir, f"{date}_{post_id}.jsonl"), comments)
+        thread = self.state["threads"][date]
+        thread["after"] = after
+        thread["count"] += len(comments)
+        thread["done"] = done
+        self.save_state()
+
+    def iter_comment_pages(self, start_date, end_date):
+        # One thread shard at a time, so callers can stream without loading every comment
+        for name in sorted(os.listdir(self.comment_dir)):
+            date = name[:10]
+            if start_date <= date < end_date:
+                yield read_jsonl(os.path.join(self.comment_dir, name))
+
+    def load_comments(self, start_date, end_date):
+        return [c for page in self.iter_comment_pages(start_date, end_date) for c in page]
@@ -0,0 +1,283 @@
+import sys
+import time
+import numpy as np
+import pandas as pd
+from prediction_cache import PredictionCache, cached_predict, models
+
+# A small student for bulk sentiment labeling, distilled from the fine-tuned
+# FinBERT (finetune_nlp.ipynb). The teacher labels a large unlabeled corpus
+# (the crawled comments and submissions; texts it has labeled before come from
+# the prediction cache), and a linear model on hashed word uni- and bigrams is
+# fitted to those labels chunk by chunk, so the corpus never has to fit in
+# memory as one matrix. Emojis and punctuation count as tokens ("🚀", "🌈🐻").
+#
+# The student labels tens of thousands of texts per second on one core. The
+# ConfidenceRouter only sends texts the student is unsure about to FinBERT:
+#
+#   student = distill(texts, "finbert-finetuned")    # fits, calibrates, saves finbert_student.joblib
+#   router = ConfidenceRouter(student, lazy_predictor("finbert-finetuned"), cache=cache)
+#   labels = router.predict(texts)
+#
+# The confidence threshold is calibrated on held-out teacher labels: the lowest
+# threshold at which the routed labels still agree with FinBERT on at least
+# `target_agreement` of the texts, so as much as possible runs at student speed.
+# compare() scores any set of predictions against the chatgpt_score labels, as
+# in 6. finbert_accuracy.ipynb.
+
+labels = ["negative", "neutral", "positive"]
+token_pattern = r"(?u)\b\w+\b|[^\w\s]"
+
+class HashedNgramStudent:
+    def __init__(self, n_features=2**19, ngram_range=(1, 2), alpha=1e-6, seed=42):
+        from sklearn.feature_extraction.text import HashingVectorizer
+        from sklearn.linear_model import SGDClassifier
+
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features, ngram_range=ngram_range, token_pattern=token_pattern,
+            alternate_sign=False, dtype=np.float32
+        )
+        self.model = SGDClassifier(loss="log_loss", alpha=alpha, random_state=seed)
+        self.seed = seed
+        self.threshold = 0.0  # set by calibrate()
+
+    def fit(self, texts, teacher_labels, epochs=5, chunk_size=50_000):
+        # Shuffled chunks per epoch; only one chunk is vectorized at a time
+        texts = [str(t) for t in texts]
+        y = np.asarray(teacher_labels)
+        rng = np.random.default_rng(self.seed)
+        for _ in range(epochs):
+            order = rng.permutation(len(texts))
+            for i in range(0, len(order), chunk_size):
+                chunk = order[i:i + chunk_size]
+                X = self.vectorizer.transform([texts[j] for j in chunk])
+                self.model.partial_fit(X, y[chunk], classes=labels)
+        return self
+
+    def predict_proba(self, texts, chunk_size=50_000):
+        texts = [str(t) for t in texts]
+        out = np.empty((len(texts), len(labels)))
+        for i in range(0, len(texts), chunk_size):
+            out[i:i + chunk_size] = self.model.predict_proba(self.vectorizer.transform(texts[i:i + chunk_size]))
+        return out
+
+    def predict_with_confidence(self, texts):
+        # (labels, probability of the predicted label)
+        proba = self.predict_proba(texts)
+        return self.model.classes_[proba.argmax(axis=1)], proba.max(axis=1)
+
+    def predict(self, texts):
+        return list(self.predict_with_confidence(texts)[0])
+
+    def calibrate(self, texts, teacher_labels, target_agreement=0.95):
+        student_labels, confidence = self.predict_with_confidence(texts)
+        self.threshold, report = calibrate_threshold(confidence, student_labels, teacher_labels, target_agreement)
+        return report
+
+    def save(self, path="finbert_student.joblib"):
+        import joblib
+        joblib.dump(self, path)
+
+    @staticmethod
+    def load(path="finbert_student.joblib"):
+        import joblib
+        return joblib.load(path)
+
+def calibrate_threshold(confidence, student_labels, teacher_labels, target_agreement=0.95):
+    # Texts above the threshold keep the student label, the rest get the
+    # teacher's; take the lowest threshold that keeps agreement >= target
+    n = len(confidence)
+    if n == 0:
+        return 0.0, {"threshold": 0.0, "student_agreement": float("nan"), "routed_agreement": float("nan"), "student_share": float("nan")}
+    confidence = np.asarray(confidence)
+    order = np.argsort(-confidence, kind="stable")
+    ranked = confidence[order]
+    agree = (np.asarray(student_labels) == np.asarray(teacher_labels))[order]
+    accepted = np.arange(n + 1)
+    agreement = (np.concatenate([[0], np.cumsum(agree)]) + n - accepted) / n
+    # The router accepts conf >= threshold, so tied confidences are accepted
+    # together: only cut where the confidence drops
+    cut = np.concatenate([[True], ranked[:-1] > ranked[1:], [True]])
+    k = int(np.flatnonzero(cut & (agreement >= target_agreement)).max())
+    threshold = float(ranked[k - 1]) if k else np.inf
+    report = {
+        "threshold": threshold,
+        "student_agreement": float(agree.mean()),
+        "routed_agreement": float(agreement[k]),
+        "student_share": k / n,
+    }
+    return threshold, report
+
+
+class ConfidenceRouter:
+    def __init__(self, student, teacher, threshold=None, cache=None):
+        # teacher: list of texts -> labels (e.g. sentiment_labeling.lazy_predictor);
+        # cache: PredictionCache, teacher labels are read from and written to it
+        self.student = student
+        self.teacher = teacher
+        self.threshold = student.threshold if threshold is None else threshold
+        self.cache = cache
+        self.stats = {}
+
+    def predict(self, texts):
+        start = time.time()
+        texts = [str(t) for t in texts]
+        # Texts FinBERT has already labeled keep that label
+        result = self.cache.get_many(texts, models["finbert"]) if self.cache is not None else [None] * len(texts)
+        todo = [i for i, label in enumerate(result) if label is None]
+
+        student_labels, confidence = self.student.predict_with_confidence([texts[i] for i in todo])
+        uncertain = []
+        for i, label, conf in zip(todo, student_labels, confidence):
+            if conf >= self.threshold:
+                result[i] = str(label)
+            else:
+                uncertain.append(i)
+
+        if uncertain:
+            uncertain_texts = [texts[i] for i in uncertain]
+            if self.cache is not None:
+                teacher_labels = cached_predict(self.cache, uncertain_texts, models["finbert"], self.teacher)
+            else:
+                teacher_labels = self.teacher(uncertain_texts)
+            for i, label in zip(uncertain, teacher_labels):
+                result[i] = label
+
+        seconds = time.time() - start
+        self.stats = {
+            "texts": len(texts),
+            "cached": len(texts) - len(todo),
+            "student": len(todo) - len(uncertain),
+            "teacher": len(uncertain),
+            "seconds": seconds,
+            "texts_per_sec": len(texts) / seconds if seconds else float("nan"),
+        }
+        print(f"✅ Routed {len(texts)} texts: {self.stats['cached']} cached, {self.stats['student']} student, "
+              f"{self.stats['teacher']} FinBERT ({seconds:.1f}s)")
+        return result
+
+# --- Training and evaluation ---
+def distill(texts, model_path="finbert-finetuned", cache_path="prediction_cache.sqlite", out_path="finbert_student.joblib",
+            holdout=0.1, target_agreement=0.95, exclude=(), epochs=5, **engine_args):
+    # Teacher labels for the corpus (cached ones are free), student fit on all
+    # but the holdout, threshold calibrated on the holdout
+    from prediction_cache import text_key
+    from sentiment_labeling import lazy_predictor
+
+    excluded = {text_key(t) for t in exclude}
+    unique = {}
+    for text in map(str, texts):
+        key = text_key(text)
+        if text.strip() and key not in excluded:
+            unique.setdefault(key, text)
+    texts = list(unique.values())
+
+    cache = PredictionCache(cache_path)
+    try:
+        teacher_labels = np.asarray(cached_predict(cache, texts, models["finbert"], lazy_predictor(model_path, **engine_args)))
+    finally:
+        cache.close()
+
+    rng = np.random.default_rng(42)
+    held_out = rng.random(len(texts)) < holdout
+    train = np.flatnonzero(~held_out)
+    test = np.flatnonzero(held_out)
+
+    start = time.time()
+    student = HashedNgramStudent().fit([texts[i] for i in train], teacher_labels[train], epochs=epochs)
+    fit_seconds = time.time() - start
+
+    start = time.time()
+    report = student.calibrate([texts[i] for i in test], teacher_labels[test], target_agreement)
+    per_sec = len(test) / (time.time() - start) if len(test) else float("nan")
+    student.save(out_path)
+
+    print(f"✅ Student fitted on {len(train)} texts in {fit_seconds:.1f}s, saved to {out_path}")
+    print(f"   Holdout ({len(test)} texts): student agrees with FinBERT on {report['student_agreement']:.1%}; "
+          f"threshold {report['threshold']:.3f} keeps {report['student_share']:.1%} at student speed "
+          f"with {report['routed_agreement']:.1%} agreement ({per_sec:,.0f} texts/sec)")
+    return student
+
+def compare(gold, predictions):
+    # Accuracy and macro F1 against the chatgpt_score labels, per model
+    from sklearn.metrics import accuracy_score, f1_score
+
+    gold = pd.Series(np.asarray(gold, dtype=object))
+    rows = []
+    for name, predicted in predictions.items():
+        predicted = pd.Series(np.asarray(predicted, dtype=object))
+        keep = predicted.notna() & gold.notna()
+        if not keep.any():
+            # Model has no predictions for these texts (nothing in the cache)
+            rows.append({"model": name, "n": 0, "accuracy": np.nan, "macro_f1": np.nan})
+            continue
+        rows.append({
+            "model": name,
+            "n": int(keep.sum()),
+            "accuracy": accuracy_score(gold[keep], predicted[keep]),
+            "macro_f1": f1_score(gold[keep], predicted[keep], labels=labels, average="macro", zero_division=0),
+        })
+    return pd.DataFrame(rows)
+
+def evaluate(labeled, student, cache, teacher=None, text_column="text"):
+    # labeled: frame with the scored text (text_column) + chatgpt_score. FinBERT
+    # labels missing from the cache come from teacher (list of texts -> labels)
+    # if given. Every model is scored on the same rows: those each cached model
+    # has a prediction for (models with nothing cached are reported with n=0).
+    from sentiment_labeling import vader_to_label
+
+    texts = labeled[text_column].astype(str).tolist()
+    start = time.time()
+    student_labels, confidence = student.predict_with_confidence(texts)
+    seconds = time.time() - start
+    if teacher is not None:
+        finbert = cached_predict(cache, texts, models["finbert"], teacher)
+    else:
+        finbert = cache.get_many(texts, models["finbert"])
+    routed = [s if c >= student.threshold else f for s, c, f in zip(student_labels, confidence, finbert)]
+
+    cached = {
+        "finbert_finetuned": finbert,
+        "roberta": cache.get_many(texts, models["roberta"]),
+        "bert": cache.get_many(texts, models["bert"]),
+        "vader": [None if v is None else vader_to_label(v) for v in cache.get_many(texts, models["vader"])],
+    }
+    keep = np.ones(len(texts), dtype=bool)
+    for values in cached.values():
+        found = np.array([v is not None for v in values], dtype=bool)
+        if found.any():
+            keep &= found
+    print(f"✅ Scoring {keep.sum()} of {len(texts)} labeled texts (the rest miss a cached prediction)")
+
+    predictions = {**cached, "student": student_labels, "student_routed": routed}
+    predictions = {name: np.asarray(values, dtype=object)[keep] for name, values in predictions.items()}
+    results = compare(np.asarray(labeled["chatgpt_score"], dtype=object)[keep], predictions)
+    share = float((confidence >= student.threshold).mean()) if len(texts) else float("nan")
+    print(f"⏱️ Student: {len(texts) / seconds:,.0f} texts/sec; {share:.1%} of texts above the threshold {student.threshold:.3f}")
+    return results
+
+
+if __name__ == "__main__":
+    # python distillation.py [model_path] [labeled_csv] [submissions_csv]: distill
+    # on the crawled tables; with labeled_csv its texts are kept out of training
+    # and scored. submissions_csv gives the scored text per id (as in
+    # 6. finbert_accuracy.ipynb); without it the labeled text column is used.
+    from sentiment_labeling import comment_texts, lazy_predictor, submission_texts
+    from storage import read_table
+
+    model_path = sys.argv[1] if len(sys.argv) > 1 else "finbert-finetuned"
+    labeled = pd.read_csv(sys.argv[2]) if len(sys.argv) > 2 else None
+    text_column = "text"
+    if len(sys.argv) > 3:
+        submissions = pd.read_csv(sys.argv[3], usecols=["id", "text"]).rename(columns={"text": "submission_text"})
+        labeled = pd.merge(labeled, submissions, on="id", how="inner")
+        text_column = "submission_text"
+    corpus = (submission_texts(read_table("wsb_arcticshift_submissions2023"))
+              + comment_texts(read_table("wsb_arcticshift_comments2023")))
+    exclude = pd.concat([labeled["text"], labeled[text_column]]).astype(str) if labeled is not None else ()
+    student = distill(corpus, model_path, exclude=exclude)
+    if labeled is not None:
+        cache = PredictionCache()
+        try:
+            print(evaluate(labeled, student, cache, lazy_predictor(model_path), text_column).to_string(index=False))
+        finally:
+            cache.close()
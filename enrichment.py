@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from instrumentation import hot
+
+# Ticker extraction and timestamp conversion for 1. ArcticShiftData.py, run on
+# chunks of submissions/comments in a process pool. The matcher is handed to
+# each worker once by the pool initializer (with fork it is simply inherited),
+# so tasks only carry the text columns of their chunk.
+#
+# The scripts have no `if __name__ == "__main__"` guard, so workers are only
+# started with fork; where fork is not available the chunks run serially.
+
+comment_columns = [
+    "post_id", "post_created_utc", "comment_created_utc", "post_title",
+    "comment_score", "tickers_mentioned", "body", "cluster_size", "cluster_score"
+]
+
+_matcher = None
+
+def _init_worker(matcher):
+    global _matcher
+    _matcher = matcher
+
+def unique(tickers):
+    # Dedupe keeping first-seen order, so every process gives the same list
+    return list(dict.fromkeys(tickers))
+
+# --- Chunk workers ---
+def _submission_chunk(titles, selftexts):
+    return [unique(_matcher.find(title) + _matcher.find(text)) for title, text in zip(titles, selftexts)]
+
+def _comment_chunk(chunk, eastern):
+    chunk = chunk.copy()
+    chunk["tickers_mentioned"] = [unique(_matcher.find(text)) for text in chunk["body"]]
+    chunk = chunk[comment_columns]
+
+    # Whole chunk at once instead of datetime.fromtimestamp per comment
+    chunk["comment_created_utc"] = pd.to_datetime(chunk["comment_created_utc"], unit="s", utc=True)
+    chunk["comment_date"] = chunk["comment_created_utc"].dt.tz_convert(eastern).dt.strftime("%Y-%m-%d %H:%M:%S")
+    chunk["post_created_utc"] = pd.to_datetime(chunk["post_created_utc"], unit="s", utc=True)
+    chunk["post_date"] = chunk["post_created_utc"].dt.tz_convert(eastern).dt.date
+    return chunk
+
+# --- Pool ---
+def chunks(df, chunk_size):
+    return [df.iloc[i:i + chunk_size] for i in range(0, len(df), chunk_size)]
+
+def run_chunks(matcher, func, args, workers=None):
+    # args: one tuple of arguments per chunk; results come back in chunk order
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(args) > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        print("⚠️ fork is not available, extracting tickers in a single process")
+        workers = 1
+    if workers == 1 or len(args) <= 1:
+        _init_worker(matcher)
+        return [func(*a) for a in args]
+
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(args)),
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=_init_worker,
+        initargs=(matcher,),
+    ) as pool:
+        return list(pool.map(func, *zip(*args)))
+
+# --- Stages ---
+@hot
+def enrich_submissions(submission_df, matcher, workers=None, chunk_size=2000):
+    titles = submission_df["title"] if "title" in submission_df.columns else pd.Series("", index=submission_df.index)
+    selftexts = submission_df["selftext"] if "selftext" in submission_df.columns else pd.Series("", index=submission_df.index)
+    args = [
+        (titles.iloc[i:i + chunk_size].tolist(), selftexts.iloc[i:i + chunk_size].tolist())
+        for i in range(0, len(submission_df), chunk_size)
+    ]
+    found = run_chunks(matcher, _submission_chunk, args, workers)
+    submission_df["companies_mentioned"] = [tickers for chunk in found for tickers in chunk]
+    return submission_df
+
+def comment_frame(comments, submission_lookup):
+    # One row per comment whose thread is a known submission
+    rows = [(c.get("link_id", "").replace("t3_", ""), c) for c in comments]
+    rows = [(post_id, c) for post_id, c in rows if post_id in submission_lookup]  # skip if we can't match comment to a post
+    return pd.DataFrame({
+        "post_id": [post_id for post_id, _ in rows],
+        "post_created_utc": [submission_lookup[post_id].get("created_utc") for post_id, _ in rows],
+        "comment_created_utc": [c.get("created_utc") for _, c in rows],
+        "post_title": [submission_lookup[post_id].get("title", "") for post_id, _ in rows],
+        "comment_score": [c.get("score") for _, c in rows],
+        "body": [c.get("body", "") for _, c in rows],
+        # Near-duplicates folded into this comment by CommentPipeline (1 without dedup)
+        "cluster_size": [c.get("cluster_size", 1) for _, c in rows],
+        "cluster_score": [c.get("cluster_score", c.get("score")) for _, c in rows],
+    })
+
+@hot
+def enrich_comments(comments, submission_lookup, matcher, eastern, workers=None, chunk_size=5000):
+    df = comment_frame(comments, submission_lookup)
+    if df.empty:
+        return pd.DataFrame(columns=comment_columns + ["comment_date", "post_date"])
+    parts = run_chunks(matcher, _comment_chunk, [(chunk, eastern) for chunk in chunks(df, chunk_size)], workers)
+    return pd.concat(parts, ignore_index=True)
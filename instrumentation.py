@@ -0,0 +1,284 @@
+import bisect
+import cProfile
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Run metrics for the pipeline scripts and the inference code. A script starts a
+# run, wraps its steps in stages and finishes the run, which writes one JSON file:
+#
+#   metrics = start_run("1. ArcticShiftData")
+#   with metrics.stage("enrich_comments", rows_in=len(comments)) as stage:
+#       df = enrich_comments(...)
+#       stage.rows_out = len(df)
+#   metrics.finish()
+#
+# Per stage: wall time, RSS before/after and the peak sampled during the stage,
+# rows in/out and rows per second. API clients record every call (latency and
+# number of attempts) into histograms per endpoint. Functions decorated with
+# @hot are counted and timed, and with profile=True each stage and hot function
+# also gets a cProfile dump (<run>/<name>.prof, open with pstats or snakeviz).
+# The JSON holds the pid and the epoch start/end of every stage, so a py-spy
+# recording of the same process can be lined up with the stages.
+#
+# Library code uses the module-level stage() and current(): without a started
+# run the block just runs and nothing is recorded.
+
+latency_buckets_ms = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000]
+
+def rss_mb():
+    # Resident memory of this process (worker processes are not included)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+def peak_rss_mb(who="self"):
+    # Peak RSS over the process lifetime ("children": largest finished child process)
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if who == "children" else resource.RUSAGE_SELF)
+    return usage.ru_maxrss / 2**20 if sys.platform == "darwin" else usage.ru_maxrss / 1024
+
+
+class Histogram:
+    # Counts per bucket (value <= bound), plus count/sum/min/max
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def to_dict(self):
+        labels = [f"<={b}" for b in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class Stage:
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.extra = {}  # anything else worth keeping, e.g. the engine's batch stats
+
+    def to_dict(self):
+        rows = self.rows_in if self.rows_in is not None else self.rows_out
+        return {
+            "name": self.name,
+            "started": self.started,
+            "ended": self.ended,
+            "seconds": self.seconds,
+            "rss_start_mb": self.rss_start,
+            "rss_end_mb": self.rss_end,
+            "rss_peak_mb": self.rss_peak,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rows_per_sec": rows / self.seconds if rows is not None and self.seconds else None,
+            **self.extra,
+        }
+
+
+class RSSSampler:
+    # Background thread keeping the highest RSS seen while a stage runs
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = rss_mb()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, rss_mb())
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, rss_mb())
+
+
+class RunMetrics:
+    def __init__(self, name, out_dir="run_metrics", profile=False, sample_interval=0.05):
+        self.name = name
+        self.out_dir = out_dir
+        self.profile = profile
+        self.sample_interval = sample_interval
+        self.started = time.time()
+        self.stages = []
+        self.calls = {}      # endpoint -> {"latency_ms", "attempts", "retries", "failures"}
+        self.functions = {}  # @hot function -> {"calls", "seconds"}
+        self.profiles = {}   # @hot function -> cProfile.Profile (profile=True only)
+        self.profiling = False  # only one cProfile can be active at a time
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        stage = Stage(name, rows_in)
+        stage.started = time.time()
+        stage.rss_start = rss_mb()
+        # Nested stages are covered by the outer stage's profile
+        profiler = cProfile.Profile() if self.profile and not self.profiling else None
+        start = time.perf_counter()
+        try:
+            with RSSSampler(self.sample_interval) as sampler:
+                if profiler:
+                    self.profiling = True
+                    profiler.enable()
+                try:
+                    yield stage
+                finally:
+                    if profiler:
+                        profiler.disable()
+                        self.profiling = False
+        finally:
+            stage.seconds = time.perf_counter() - start
+            stage.ended = time.time()
+            stage.rss_end = rss_mb()
+            stage.rss_peak = sampler.peak
+            self.stages.append(stage)
+            if profiler:
+                self._dump(profiler, f"stage_{len(self.stages):02d}_{name}")
+            rate = stage.to_dict()["rows_per_sec"]
+            print(f"⏱️ {name}: {stage.seconds:.2f}s, peak {stage.rss_peak:.0f} MB" + (f", {rate:,.0f} rows/sec" if rate else ""))
+
+    def record_call(self, endpoint, attempt_seconds, ok=True):
+        # One finished API call: the latency of each attempt (retries included)
+        with self.lock:
+            call = self.calls.setdefault(endpoint, {
+                "latency_ms": Histogram(latency_buckets_ms),
+                "attempts": Histogram(range(1, 11)),
+                "retries": 0,
+                "failures": 0,
+            })
+            for seconds in attempt_seconds:
+                call["latency_ms"].add(seconds * 1000)
+            call["attempts"].add(len(attempt_seconds))
+            call["retries"] += len(attempt_seconds) - 1
+            call["failures"] += 0 if ok else 1
+
+    def record_function(self, name, seconds):
+        with self.lock:
+            f = self.functions.setdefault(name, {"calls": 0, "seconds": 0.0})
+            f["calls"] += 1
+            f["seconds"] += seconds
+
+    def to_dict(self):
+        return {
+            "run": self.name,
+            "pid": os.getpid(),
+            "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(),
+            "seconds": time.time() - self.started,
+            "peak_rss_mb": peak_rss_mb(),
+            "peak_rss_children_mb": peak_rss_mb("children"),
+            "stages": [s.to_dict() for s in self.stages],
+            "api_calls": {
+                endpoint: {
+                    "latency_ms": c["latency_ms"].to_dict(),
+                    "attempts": c["attempts"].to_dict(),
+                    "retries": c["retries"],
+                    "failures": c["failures"],
+                }
+                for endpoint, c in self.calls.items()
+            },
+            "functions": self.functions,
+        }
+
+    def _dump(self, profiler, label):
+        os.makedirs(self.run_dir(), exist_ok=True)
+        profiler.dump_stats(os.path.join(self.run_dir(), f"{label}.prof"))
+
+    def run_dir(self):
+        stamp = datetime.fromtimestamp(self.started).strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.out_dir, f"{self.name.replace(' ', '_')}-{stamp}-{os.getpid()}")
+
+    def finish(self):
+        # Writes <out_dir>/<name>-<time>/metrics.json (and the hot-function profiles)
+        global _current
+        for name, profiler in self.profiles.items():
+            self._dump(profiler, name)
+        os.makedirs(self.run_dir(), exist_ok=True)
+        path = os.path.join(self.run_dir(), "metrics.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=1, default=str)
+        if _current is self:
+            _current = None
+        print(f"✅ Saved run metrics to {path}")
+        return path
+
+# --- Current run ---
+_current = None
+
+def start_run(name, out_dir="run_metrics", profile=None):
+    # profile=None reads PIPELINE_PROFILE=1 from the environment
+    global _current
+    if profile is None:
+        profile = os.environ.get("PIPELINE_PROFILE", "") not in ("", "0")
+    _current = RunMetrics(name, out_dir=out_dir, profile=profile)
+    return _current
+
+def current():
+    return _current
+
+@contextmanager
+def stage(name, rows_in=None):
+    # Stage of the current run, if there is one
+    if _current is None:
+        yield Stage(name, rows_in)
+        return
+    with _current.stage(name, rows_in) as s:
+        yield s
+
+def hot(func):
+    # Counts and times calls to func in the current run; with profile=True the
+    # calls are also collected into one cProfile per function (unless a stage
+    # profile is already running, which then includes them)
+    name = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        run = _current
+        if run is None:
+            return func(*args, **kwargs)
+        profiler = None
+        if run.profile and not run.profiling:
+            profiler = run.profiles.setdefault(name, cProfile.Profile())
+            run.profiling = True
+        start = time.perf_counter()
+        try:
+            if profiler:
+                return profiler.runcall(func, *args, **kwargs)
+            return func(*args, **kwargs)
+        finally:
+            run.record_function(name, time.perf_counter() - start)
+            if profiler:
+                run.profiling = False
+
+    return wrapper
@@ -0,0 +1,297 @@
+import asyncio
+import datetime as dt
+import json
+import math
+import os
+import sys
+import time
+from collections import Counter
+import pandas as pd
+from arcticshift_client import COMMENT_PATH, SUBMISSION_PATH, ArcticShiftClient, is_daily_thread
+from comment_pipeline import is_low_quality
+from crawl_store import est_date
+from enrichment import unique
+from sentiment_features import consensus_label
+from storage import OUTPUT_FORMAT, write_table
+
+# Streaming mode: instead of a backfill over start_date/end_date, poll
+# ArcticShift for new submissions and daily-thread comments, match tickers and
+# label sentiment as they arrive, and keep the (date, ticker) features of
+# 3. MakeDataFile.py up to date in memory:
+#   python live_stream.py finbert-finetuned                       (from yesterday on)
+#   python live_stream.py finbert-finetuned 2024-04-01 http://localhost:8080
+# The second form follows replay_server.py playing back a recording.
+#
+# FeatureStore keeps the sums behind calc_sentiment_metrics / calc_general_sentiment
+# (consensus counts, like scores, num_comments sum and count, flair counts,
+# mentions), so frame() gives the same columns as those two merged. Every
+# `snapshot_seconds` the features go to the `live_features` table and the raw
+# sums plus the poll cursors to live_state.json; a restart resumes from there.
+#
+# Unlike the batch run, every comment that passes the bot filter counts, not
+# only the top 200 of a thread (scores are still changing while a thread is live).
+
+count_cols = [
+    "no_positive_consensus", "no_neutral_consensus", "no_negative_consensus",
+    "like_score_positive", "like_score_negative", "num_comments_sum", "num_comments_n", "number_of_mentions",
+]
+
+class FeatureStore:
+    def __init__(self):
+        self.tickers = {}  # (date, ticker) -> sums in count_cols order
+        self.flairs = {}   # (date, ticker) -> Counter of link_flair_text
+        self.general = {}  # date -> [positive, neutral, negative] of items without tickers
+
+    def add(self, date, tickers, consensus, score=0, num_comments=None, flair=None):
+        # One submission or comment; like calc_sentiment_metrics, every ticker it mentions gets a row
+        if not tickers:
+            counts = self.general.setdefault(date, [0, 0, 0])
+            if consensus in ("positive", "neutral", "negative"):
+                counts[("positive", "neutral", "negative").index(consensus)] += 1
+            return
+        score = score or 0
+        for ticker in tickers:
+            sums = self.tickers.setdefault((date, ticker), [0] * len(count_cols))
+            if consensus == "positive":
+                sums[0] += 1
+                sums[3] += score
+            elif consensus == "neutral":
+                sums[1] += 1
+            elif consensus == "negative":
+                sums[2] += 1
+                sums[4] += score
+            if num_comments is not None and not (isinstance(num_comments, float) and math.isnan(num_comments)):
+                sums[5] += num_comments
+                sums[6] += 1
+            sums[7] += 1
+            if flair is not None:
+                self.flairs.setdefault((date, ticker), Counter())[flair] += 1
+
+    def frame(self, dates=None):
+        # ticker_sentiment.merge(general_sentiment, on="date", how="left") as in 3. MakeDataFile.py
+        keys = [k for k in self.tickers if dates is None or k[0] in dates]
+        sums = pd.DataFrame([self.tickers[k] for k in keys], columns=count_cols, dtype="float64")
+        df = pd.DataFrame({"date": [k[0] for k in keys], "ticker": [k[1] for k in keys]})
+        for col in count_cols[:3]:
+            df[col] = sums[col].astype("int64")
+        df["like_score_positive"] = sums["like_score_positive"]
+        df["like_score_negative"] = sums["like_score_negative"]
+        df["avg_num_comments"] = sums["num_comments_sum"] / sums["num_comments_n"].where(sums["num_comments_n"] > 0)
+        # Most common flair, ties to the smallest like most_common()
+        df["most_mentioned_link_flair_text"] = [
+            min(self.flairs[k].items(), key=lambda item: (-item[1], item[0]))[0] if k in self.flairs else None
+            for k in keys
+        ]
+        df["number_of_mentions"] = sums["number_of_mentions"].astype("int64")
+        df["ticker_consensus_label"] = consensus_label(df["no_positive_consensus"].to_numpy(), df["no_negative_consensus"].to_numpy())
+
+        general = pd.DataFrame(
+            [[date] + counts for date, counts in self.general.items() if dates is None or date in dates],
+            columns=["date", "no_positive_consensus_general", "no_neutral_consensus_general", "no_negative_consensus_general"],
+        )
+        general["general_consensus_label"] = consensus_label(
+            general["no_positive_consensus_general"].to_numpy(), general["no_negative_consensus_general"].to_numpy()
+        )
+        return df.merge(general, on="date", how="left").sort_values(["date", "ticker"]).reset_index(drop=True)
+
+    def to_dict(self):
+        return {
+            "tickers": [[date, ticker] + sums for (date, ticker), sums in self.tickers.items()],
+            "flairs": [[date, ticker, dict(counts)] for (date, ticker), counts in self.flairs.items()],
+            "general": self.general,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        store = cls()
+        store.tickers = {(row[0], row[1]): row[2:] for row in data["tickers"]}
+        store.flairs = {(row[0], row[1]): Counter(row[2]) for row in data["flairs"]}
+        store.general = dict(data["general"])
+        return store
+
+
+class LiveStream:
+    # matcher: TickerMatcher; labeler: list of texts -> consensus labels
+    # (sentiment_labeling.consensus_labeler); since: "YYYY-MM-DD" or epoch seconds
+    def __init__(self, matcher, labeler, since=None, subreddit="wallstreetbets", poll_seconds=60,
+                 snapshot_seconds=300, keep_days=2, name="live_features", state_path="live_state.json",
+                 fmt=OUTPUT_FORMAT, client_args=None):
+        self.matcher = matcher
+        self.labeler = labeler
+        self.subreddit = subreddit
+        self.poll_seconds = poll_seconds
+        self.snapshot_seconds = snapshot_seconds
+        self.keep_days = keep_days  # daily threads (and seen ids) followed after their day
+        self.name = name
+        self.state_path = state_path
+        self.fmt = fmt
+        self.client_args = client_args or {}
+
+        self.store = FeatureStore()
+        self.posts_after = self.start_cursor(since)
+        self.threads = {}  # post_id -> {"date": ..., "after": comment cursor}
+        self.seen = {}     # date -> ids already counted
+        self.last_snapshot = time.monotonic()
+        self.stats = Counter()
+        if os.path.exists(state_path):
+            self.restore()
+
+    @staticmethod
+    def start_cursor(since):
+        if since is None:
+            since = time.time() - 86400
+        elif isinstance(since, str):
+            since = dt.datetime.strptime(since, "%Y-%m-%d").replace(tzinfo=dt.timezone.utc).timestamp()
+        return int(since)
+
+    # --- Polling ---
+    async def poll_posts(self, client):
+        posts = []
+        while True:
+            params = {
+                "subreddit": self.subreddit,
+                "after": dt.datetime.fromtimestamp(self.posts_after, tz=dt.timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                "limit": "auto",
+                "sort": "asc",
+                "sort_type": "created_utc",
+            }
+            data = await client.get(SUBMISSION_PATH, params)
+            if not data:
+                return posts
+            posts.extend(data)
+            last = int(data[-1]["created_utc"])
+            if last <= self.posts_after:
+                return posts
+            self.posts_after = last
+
+    async def poll_thread(self, client, post_id):
+        thread = self.threads[post_id]
+        comments = []
+        while True:
+            params = {"link_id": f"t3_{post_id}", "limit": "auto", "sort": "asc", "sort_type": "created_utc"}
+            if thread["after"]:
+                params["after"] = thread["after"]
+            data = await client.get(COMMENT_PATH, params)
+            if not data:
+                return comments
+            comments.extend(data)
+            last = int(data[-1]["created_utc"])
+            moved = last > (thread["after"] or 0)
+            thread["after"] = max(last, thread["after"] or 0)
+            if len(data) < 100 or not moved:
+                return comments
+
+    async def poll(self, client):
+        posts = await self.poll_posts(client)
+        for post in posts:
+            if is_daily_thread(post) and post["id"] not in self.threads:
+                self.threads[post["id"]] = {"date": est_date(post["created_utc"]), "after": None}
+                print(f"🔄 Following daily thread {post['id']} ({self.threads[post['id']]['date']})")
+        self.forget_old()
+
+        comments = []
+        for post_id in list(self.threads):
+            comments.extend((post_id, c) for c in await self.poll_thread(client, post_id))
+        self.process(posts, comments)
+
+    # --- Processing ---
+    def is_new(self, date, item_id):
+        seen = self.seen.setdefault(date, set())
+        if item_id in seen:
+            return False
+        seen.add(item_id)
+        return True
+
+    def process(self, posts, comments):
+        rows = []  # (date, tickers, text, score, num_comments, flair)
+        for post in posts:
+            date = est_date(post["created_utc"])
+            if post.get("removed_by_category") or not self.is_new(date, post["id"]):
+                continue
+            title, selftext = post.get("title", "") or "", post.get("selftext", "") or ""
+            tickers = unique(self.matcher.find(title) + self.matcher.find(selftext))
+            rows.append((date, tickers, (title + " " + selftext).strip(), post.get("score", 0),
+                         post.get("num_comments"), post.get("link_flair_text")))
+        n_posts = len(rows)
+        for post_id, comment in comments:
+            # Comments count on their thread's date, like post_created_utc in 3. MakeDataFile.py
+            date = self.threads[post_id]["date"]
+            if is_low_quality(comment) or not self.is_new(date, comment["id"]):
+                continue
+            body = comment.get("body", "") or ""
+            rows.append((date, unique(self.matcher.find(body)), body, comment.get("score", 0), None, None))
+
+        self.stats["posts"] += n_posts
+        self.stats["comments"] += len(rows) - n_posts
+
+        labels = self.labeler([text for _, _, text, _, _, _ in rows])
+        for (date, tickers, _, score, num_comments, flair), label in zip(rows, labels):
+            self.store.add(date, tickers, label, score, num_comments, flair)
+
+    def forget_old(self):
+        # Only the newest keep_days days are followed: older threads stop being
+        # polled and their seen ids are dropped
+        dates = sorted({t["date"] for t in self.threads.values()} | set(self.seen))
+        if len(dates) <= self.keep_days:
+            return
+        cutoff = dates[-self.keep_days]
+        self.threads = {p: t for p, t in self.threads.items() if t["date"] >= cutoff}
+        self.seen = {d: ids for d, ids in self.seen.items() if d >= cutoff}
+
+    # --- Snapshots ---
+    def snapshot(self):
+        features = self.store.frame()
+        path = write_table(features, self.name, fmt=self.fmt)
+        state = {
+            "posts_after": self.posts_after,
+            "threads": self.threads,
+            "seen": {d: sorted(ids) for d, ids in self.seen.items()},
+            "store": self.store.to_dict(),
+        }
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+        self.last_snapshot = time.monotonic()
+        print(f"✅ Snapshot: {len(features)} (date, ticker) rows -> {path}")
+        return path
+
+    def restore(self):
+        with open(self.state_path, encoding="utf-8") as f:
+            state = json.load(f)
+        self.posts_after = state["posts_after"]
+        self.threads = state["threads"]
+        self.seen = {d: set(ids) for d, ids in state["seen"].items()}
+        self.store = FeatureStore.from_dict(state["store"])
+        print(f"✅ Resumed from {self.state_path} ({len(self.store.tickers)} (date, ticker) rows)")
+
+    async def run(self, max_polls=None):
+        # Poll until stopped (or max_polls rounds), snapshotting on the way and at the end
+        polls = 0
+        async with ArcticShiftClient(**self.client_args) as client:
+            try:
+                while max_polls is None or polls < max_polls:
+                    started = time.monotonic()
+                    await self.poll(client)
+                    polls += 1
+                    print(f"  → Poll {polls}: {self.stats['posts']} posts and {self.stats['comments']} comments so far, "
+                          f"{len(self.threads)} threads followed")
+                    if time.monotonic() - self.last_snapshot >= self.snapshot_seconds:
+                        self.snapshot()
+                    if max_polls is None or polls < max_polls:
+                        await asyncio.sleep(max(0.0, self.poll_seconds - (time.monotonic() - started)))
+            finally:
+                self.snapshot()
+        return self.store
+
+
+if __name__ == "__main__":
+    from sentiment_labeling import consensus_labeler
+    from ticker_matcher import TickerMatcher, load_company_dict
+
+    model_path = sys.argv[1] if len(sys.argv) > 1 else "finbert-finetuned"
+    since = sys.argv[2] if len(sys.argv) > 2 else None
+    client_args = {"base_url": sys.argv[3]} if len(sys.argv) > 3 else {}
+    stream = LiveStream(TickerMatcher(load_company_dict("russel_3000.csv")), consensus_labeler(model_path),
+                        since=since, client_args=client_args)
+    asyncio.run(stream.run())
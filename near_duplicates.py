@@ -0,0 +1,148 @@
+import re
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Near-duplicate comment detection for comment_pipeline.py (copy-pasted memes,
+# rocket-emoji spam, the same text posted in several threads). Every body gets
+# a MinHash signature of its character shingles; signatures are split into
+# bands and hashed into LSH buckets, so a comment is only compared with the
+# comments sharing a bucket with it. A candidate counts as a duplicate when the
+# signatures agree on at least `threshold` of their positions (the estimated
+# Jaccard similarity of the shingle sets). Shingle hashes and signatures are
+# computed for a batch of bodies at once with NumPy.
+#
+# The first comment of a cluster is its representative; later members are
+# only counted (cluster size and summed score). Short bodies ("🚀🚀🚀", "TSLA
+# calls") are only clustered within their own thread, longer ones across
+# threads too. Clusters that have not been hit for `window_days` days are
+# dropped from the index, so memory stays at a few days of comments.
+
+_prime = (1 << 31) - 1
+_repeats = re.compile(r"(.)\1{3,}")
+_spaces = re.compile(r"\s+")
+
+def normalize(text):
+    # Lowercase, collapse whitespace, and cut runs of the same character to
+    # three ("🚀🚀🚀🚀🚀🚀" and "🚀🚀🚀🚀" become the same text)
+    text = _spaces.sub(" ", (text or "").lower()).strip()
+    return _repeats.sub(r"\1\1\1", text)
+
+def _mod_prime(v):
+    # v mod 2**31 - 1 without a division (v < 2**62); 0 may come out as p, which
+    # is just another hash value
+    v = (v & np.uint64(_prime)) + (v >> np.uint64(31))
+    return (v & np.uint64(_prime)) + (v >> np.uint64(31))
+
+def shingles(text, k=5):
+    # Character k-grams; texts shorter than k are padded to one k-gram
+    text = text.ljust(k, "\0")
+    return [text[i:i + k] for i in range(len(text) - k + 1)]
+
+
+class MinHasher:
+    def __init__(self, num_perm=32, k=5, seed=1):
+        rng = np.random.default_rng(seed)
+        # Multiply-add-shift hashing: top 32 bits of (a * x + b) mod 2**64, one (a, b) per permutation
+        self.a = rng.integers(0, 1 << 64, num_perm, dtype=np.uint64, endpoint=False) | np.uint64(1)
+        self.b = rng.integers(0, 1 << 64, num_perm, dtype=np.uint64, endpoint=False)
+        self.k = k
+        # k-gram hash: polynomial in the code points (< 2**21) mod p
+        self.powers = np.array([pow(1_000_003, j, _prime) for j in range(k)], dtype=np.uint64)
+
+    def signatures(self, texts):
+        # (len(texts), num_perm) uint32 signatures of already normalized texts
+        k = self.k
+        if not texts:
+            return np.zeros((0, len(self.a)), dtype=np.uint32)
+        texts = [t.ljust(k, "\0") for t in texts]
+        codes = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        grams = _mod_prime((sliding_window_view(codes, k) * self.powers).sum(axis=1))
+
+        # Only the k-grams inside one text: text i has len - k + 1 of them
+        lengths = np.array([len(t) for t in texts])
+        counts = lengths - k + 1
+        first = np.cumsum(counts) - counts
+        offsets = np.cumsum(lengths) - lengths
+        x = grams[np.repeat(offsets - first, counts) + np.arange(counts.sum())]
+
+        values = self.a[:, None] * x[None, :]
+        values += self.b[:, None]
+        values >>= np.uint64(32)
+        return np.minimum.reduceat(values, first, axis=1).T.astype(np.uint32)
+
+
+class NearDuplicateFilter:
+    # Usage (see CommentPipeline):
+    #   cluster, is_new = dedup.add(comment)    # is_new=False -> drop the comment
+    #   dedup.sizes[cluster], dedup.scores[cluster]
+    # prepare() does the hashing for a batch of comments up front.
+    def __init__(self, threshold=0.8, num_perm=32, bands=8, cross_thread_chars=40, window_days=3, seed=1):
+        assert num_perm % bands == 0, "num_perm must be a multiple of bands"
+        self.hasher = MinHasher(num_perm, seed=seed)
+        self.min_agree = threshold * num_perm  # signature positions that must agree
+        self.bands = bands
+        self.cross_thread_chars = cross_thread_chars
+        self.window_days = window_days
+
+        self.buckets = {}      # (thread or None, band, band bytes) -> cluster id
+        self.signature = {}    # cluster id -> representative signature (while indexed)
+        self.keys = {}         # cluster id -> its bucket keys (while indexed)
+        self.last_day = []     # cluster id -> last day it was hit
+        self.sizes = []        # cluster id -> number of comments
+        self.scores = []       # cluster id -> summed score
+        self.current_day = None
+        self.n_duplicates = 0
+
+    def prepare(self, comments):
+        # (signature, normalized length) for every comment, for add()
+        texts = [normalize(c.get("body", "")) for c in comments]
+        return list(zip(self.hasher.signatures(texts), map(len, texts)))
+
+    def add(self, comment, prepared=None):
+        signature, length = prepared if prepared is not None else self.prepare([comment])[0]
+        day = int(comment.get("created_utc") or 0) // 86400
+        self.expire(day)
+
+        # Short bodies only match within their thread
+        scope = None if length >= self.cross_thread_chars else comment.get("link_id", "")
+        rows = len(signature) // self.bands
+        keys = [(scope, band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(self.bands)]
+
+        for key in keys:
+            cluster = self.buckets.get(key)
+            if cluster is not None and np.count_nonzero(self.signature[cluster] == signature) >= self.min_agree:
+                self.sizes[cluster] += 1
+                self.scores[cluster] += comment.get("score", 0) or 0
+                self.last_day[cluster] = max(self.last_day[cluster], day)
+                self.n_duplicates += 1
+                return cluster, False
+
+        cluster = len(self.sizes)
+        self.sizes.append(1)
+        self.scores.append(comment.get("score", 0) or 0)
+        self.last_day.append(day)
+        self.signature[cluster] = signature
+        self.keys[cluster] = keys
+        for key in keys:
+            self.buckets.setdefault(key, cluster)
+        return cluster, True
+
+    def expire(self, day):
+        # Once per new day: forget clusters not hit within window_days
+        if self.current_day is not None and day <= self.current_day:
+            return
+        self.current_day = day
+        cutoff = day - self.window_days
+        for cluster in [c for c in self.signature if self.last_day[c] < cutoff]:
+            for key in self.keys.pop(cluster):
+                if self.buckets.get(key) == cluster:
+                    del self.buckets[key]
+            del self.signature[cluster]
+
+    def stats(self):
+        return {
+            "clusters": len(self.sizes),
+            "duplicates": self.n_duplicates,
+            "largest_cluster": max(self.sizes, default=0),
+            "indexed": len(self.signature),
+        }
@@ -0,0 +1,287 @@
+import numpy as np
+import pandas as pd
+import pandas_market_calendars as mcal
+from instrumentation import hot
+from storage import OUTPUT_FORMAT, append_table, read_table, table_exists, write_table
+
+# Date x ticker panel construction for 3. MakeDataFile.py. build_panel makes the
+# full panel; append_days extends an existing panel with new trading days using
+# only the new days' data plus the last row of every ticker.
+#
+# CompactPanel holds the same panel for large ticker universes (the whole of
+# russel_3000.csv): prices, volume and target as float32/int8 (ticker, day)
+# arrays, sentiment only for the ticker-days with mentions, with categorical
+# tickers/labels and the smallest dtype that holds each column. The zeros and
+# "equal" labels of the other ticker-days are only filled in by dense().
+
+sentiment_cols = [
+    "no_positive_consensus", "no_neutral_consensus", "no_negative_consensus",
+    "like_score_positive", "like_score_negative", "avg_num_comments",
+    "number_of_mentions", "no_positive_consensus_general", "no_neutral_consensus_general",
+    "no_negative_consensus_general"
+]
+label_cols = ["ticker_consensus_label", "general_consensus_label"]
+market_cols = ["closing_price", "volume", "closing_price_next_day"]
+
+def market_long(closing_price, volume):
+    # Reshape market data to long format
+    volume = volume.melt(id_vars=["Date"], var_name="ticker", value_name="volume")
+    closing_price = closing_price.melt(id_vars=["Date"], var_name="ticker", value_name="closing_price")
+
+    # Normalize dates for safe merging
+    closing_price["Date"] = pd.to_datetime(closing_price["Date"]).dt.normalize()
+    volume["Date"] = pd.to_datetime(volume["Date"]).dt.normalize()
+
+    # Merge price and volume
+    return closing_price.merge(volume, on=["Date", "ticker"], how="outer")
+
+def trading_days(start_date, end_date):
+    # Valid NYSE days (timezone-aware → timezone-naive)
+    nyse = mcal.get_calendar('NYSE')
+    days = nyse.valid_days(start_date=start_date.strftime('%Y-%m-%d'), end_date=end_date.strftime('%Y-%m-%d'))
+    return days.tz_convert(None).normalize()
+
+def reindex_market(market, days, tickers):
+    market = market[market["Date"].isin(days)]
+    market = market.rename(columns={"Date": "date"})
+    full_index = pd.MultiIndex.from_product([days, tickers], names=["date", "ticker"])
+    return market.set_index(["date", "ticker"]).reindex(full_index).reset_index()
+
+def add_target(market):
+    market["closing_price_next_day"] = market.groupby("ticker")["closing_price"].shift(-1)
+    market["target"] = (market["closing_price_next_day"] > market["closing_price"]).astype(int)
+    return market
+
+def merge_features(market, features):
+    features = features.assign(date=pd.to_datetime(features["date"]))
+    final = market.merge(features, on=["date", "ticker"], how="left")
+
+    # Fill missing sentiment data with 0 or neutral (always float, so a batch of
+    # days where every ticker was mentioned has the same dtypes as the rest)
+    return fill_features(final)
+
+def fill_features(df):
+    df[sentiment_cols] = df[sentiment_cols].fillna(0).astype(float)
+    df["ticker_consensus_label"] = df["ticker_consensus_label"].fillna("equal")
+    df["general_consensus_label"] = df["general_consensus_label"].fillna("equal")
+    return df
+
+def market_panel(market):
+    # Every trading day x ticker with forward-filled price and volume plus the target
+    days = trading_days(market["Date"].min(), market["Date"].max())
+    market = reindex_market(market, days, market["ticker"].unique())
+
+    # Forward-fill price and volume
+    market = market.sort_values(by=["ticker", "date"])
+    market[["closing_price", "volume"]] = market.groupby("ticker")[["closing_price", "volume"]].ffill()
+    return add_target(market)
+
+@hot
+def build_panel(market, features):
+    return merge_features(market_panel(market), features)
+
+@hot
+def build_compact_panel(market, features):
+    return CompactPanel.from_frames(market_panel(market), features)
+
+@hot
+def append_days(panel_tail, market, features):
+    # panel_tail: the panel's rows for its last date (one per ticker)
+    # market/features: data for dates after that day (earlier rows are ignored)
+    # Returns (panel_tail with next-day close/target filled in, new rows)
+    last_date = panel_tail["date"].max()
+    market = market[market["Date"] > last_date]
+    if market.empty:
+        return panel_tail, panel_tail.iloc[:0]
+
+    days = trading_days(last_date + pd.Timedelta(days=1), market["Date"].max())
+    # Tickers new in the market data join the panel from their first new day on
+    tickers = pd.Index(panel_tail["ticker"].unique()).union(pd.Index(market["ticker"].unique()))
+    new = reindex_market(market, days, tickers)
+
+    # Carry the forward-fill state: seed each ticker with its last known row
+    seed = panel_tail[["date", "ticker", "closing_price", "volume"]]
+    new = pd.concat([seed, new], ignore_index=True).sort_values(by=["ticker", "date"])
+    new[["closing_price", "volume"]] = new.groupby("ticker")[["closing_price", "volume"]].ffill()
+    new = add_target(new)
+
+    # The seed rows now hold the previous day's next-day close and target
+    is_seed = new["date"] == last_date
+    tail_update = new[is_seed].set_index("ticker")
+    panel_tail = panel_tail.copy()
+    panel_tail["closing_price_next_day"] = panel_tail["ticker"].map(tail_update["closing_price_next_day"])
+    panel_tail["target"] = panel_tail["ticker"].map(tail_update["target"]).astype(int)
+
+    new = merge_features(new[~is_seed], features)
+    return panel_tail, new[panel_tail.columns]
+
+def load_panel(name, columns=None, start_date=None, end_date=None):
+    # Date-partitioned panels come back date by date; restore the ticker/date order.
+    # A panel saved by CompactPanel.save comes back as its dense view.
+    if not table_exists(name) and table_exists(f"{name}_market"):
+        return CompactPanel.load(name, start_date=start_date, end_date=end_date).dense(columns=columns)
+    panel = read_table(name, columns=columns, start_date=start_date, end_date=end_date, date_column="date")
+    if "date" in panel.columns:
+        panel["date"] = pd.to_datetime(panel["date"])
+    if "ticker" in panel.columns and "date" in panel.columns:
+        panel = panel.sort_values(by=["ticker", "date"], kind="mergesort").reset_index(drop=True)
+    return panel
+
+# --- Compact panel ---
+def downcast(df):
+    # Whole-number columns -> smallest integer type, other numbers -> float32,
+    # strings -> categorical
+    df = df.copy()
+    for col in df.columns:
+        values = df[col]
+        if pd.api.types.is_bool_dtype(values) or pd.api.types.is_datetime64_any_dtype(values):
+            continue
+        if pd.api.types.is_numeric_dtype(values):
+            numbers = values.to_numpy(dtype=np.float64)
+            if np.isfinite(numbers).all() and (numbers == np.round(numbers)).all():
+                df[col] = pd.to_numeric(numbers.astype(np.int64), downcast="integer")
+            else:
+                df[col] = values.astype(np.float32)
+        elif pd.api.types.is_string_dtype(values) or values.dtype == object:
+            df[col] = values.astype("category")
+    return df
+
+class CompactPanel:
+    # tickers x dates grid for the market data, mention rows for the sentiment:
+    #   prices[name]: (ticker, date) float32 array for closing_price, volume, closing_price_next_day
+    #   target: (ticker, date) int8
+    #   mentions: one row per ticker-day with mentions (date, ticker + feature columns)
+    def __init__(self, tickers, dates, prices, target, mentions, feature_columns):
+        self.tickers = pd.Index(tickers, name="ticker")
+        self.dates = pd.DatetimeIndex(dates, name="date")
+        self.prices = prices
+        self.target = target
+        self.mentions = mentions
+        self.feature_columns = list(feature_columns)
+
+    @classmethod
+    def from_frames(cls, market, features):
+        # market: long rows with date, ticker, closing_price, volume, closing_price_next_day
+        # and target (market_panel); features: sentiment rows per date and ticker
+        tickers = pd.Index(np.sort(market["ticker"].unique()))
+        dates = pd.DatetimeIndex(np.sort(pd.to_datetime(market["date"]).unique()))
+        t = tickers.get_indexer(market["ticker"])
+        d = dates.get_indexer(pd.to_datetime(market["date"]))
+
+        prices = {}
+        for col in market_cols:
+            prices[col] = np.full((len(tickers), len(dates)), np.nan, dtype=np.float32)
+            prices[col][t, d] = market[col].to_numpy(dtype=np.float32)
+        target = np.zeros((len(tickers), len(dates)), dtype=np.int8)
+        target[t, d] = market["target"].to_numpy()
+
+        # Only ticker-days that are in the grid, filled like merge_features
+        features = features.assign(date=pd.to_datetime(features["date"]))
+        features = features[features["ticker"].isin(tickers).to_numpy() & features["date"].isin(dates).to_numpy()]
+        feature_columns = [c for c in features.columns if c not in ("date", "ticker")]
+        mentions = downcast(fill_features(features.copy()))
+        mentions["ticker"] = pd.Categorical(mentions["ticker"].astype(str), categories=tickers)
+        mentions = mentions.sort_values(["ticker", "date"]).reset_index(drop=True)
+        return cls(tickers, dates, prices, target, mentions, feature_columns)
+
+    @classmethod
+    def from_dense(cls, panel):
+        # From a panel in build_panel's layout (e.g. load_panel or append_days output)
+        panel = panel.assign(date=pd.to_datetime(panel["date"]))
+        features = panel[panel["number_of_mentions"].to_numpy() > 0]
+        features = features[["date", "ticker"] + [c for c in panel.columns if c not in ["date", "ticker", "target"] + market_cols]]
+        return cls.from_frames(panel[["date", "ticker", "target"] + market_cols], features)
+
+    def memory_mb(self):
+        arrays = sum(a.nbytes for a in self.prices.values()) + self.target.nbytes
+        return (arrays + self.mentions.memory_usage(deep=True).sum()) / 1e6
+
+    def __len__(self):
+        return len(self.tickers) * len(self.dates)
+
+    def selection(self, tickers=None, start_date=None, end_date=None):
+        # Positions of the selected tickers and dates (start inclusive, end exclusive)
+        t = np.arange(len(self.tickers)) if tickers is None else np.sort(self.tickers.get_indexer(tickers))
+        t = t[t >= 0]
+        keep = np.ones(len(self.dates), dtype=bool)
+        if start_date is not None:
+            keep &= self.dates >= pd.Timestamp(start_date)
+        if end_date is not None:
+            keep &= self.dates < pd.Timestamp(end_date)
+        return t, np.flatnonzero(keep)
+
+    def market_frame(self, tickers=None, start_date=None, end_date=None):
+        # Long (ticker, date) market rows, compact dtypes
+        t, d = self.selection(tickers, start_date, end_date)
+        frame = pd.DataFrame({
+            "date": np.tile(self.dates[d].to_numpy(), len(t)),
+            "ticker": pd.Categorical.from_codes(np.repeat(t, len(d)), categories=self.tickers),
+        })
+        for col in market_cols:
+            frame[col] = self.prices[col][np.ix_(t, d)].ravel()
+        frame["target"] = self.target[np.ix_(t, d)].ravel()
+        return frame
+
+    def dense(self, tickers=None, start_date=None, end_date=None, columns=None, downcast=False):
+        # The panel as build_panel returns it (ticker, date order), optionally for a
+        # subset of tickers, dates and columns. downcast=True keeps the compact dtypes
+        # (float32, small ints, categoricals) instead of float64/object.
+        t, d = self.selection(tickers, start_date, end_date)
+        frame = self.market_frame(tickers, start_date, end_date)
+        wanted = lambda col: columns is None or col in columns
+
+        # Where every selected mention row lands in the (ticker, date) grid
+        t_pos = np.full(len(self.tickers), -1)
+        t_pos[t] = np.arange(len(t))
+        d_pos = np.full(len(self.dates), -1)
+        d_pos[d] = np.arange(len(d))
+        rows_t = t_pos[self.mentions["ticker"].cat.codes.to_numpy()]
+        rows_d = d_pos[self.dates.get_indexer(self.mentions["date"])]
+        hit = (rows_t >= 0) & (rows_d >= 0)
+        rows = rows_t[hit] * len(d) + rows_d[hit]
+
+        for col in self.feature_columns:
+            if not wanted(col):
+                continue
+            values = self.mentions[col][hit]
+            if col in sentiment_cols:
+                dtype = values.dtype if downcast else np.float64
+                out = np.zeros(len(frame), dtype=dtype)
+                out[rows] = values.to_numpy()
+            else:
+                fill = "equal" if col in label_cols else np.nan
+                out = np.full(len(frame), fill, dtype=object)
+                out[rows] = values.astype(object).to_numpy()
+                if downcast:
+                    out = pd.Categorical(out)
+            frame[col] = out
+
+        if downcast:
+            frame["target"] = frame["target"].astype(np.int8)
+        else:
+            frame["ticker"] = frame["ticker"].astype(str)
+            frame[market_cols] = frame[market_cols].astype(np.float64)
+            frame["target"] = frame["target"].astype(int)
+        if columns is not None:
+            frame = frame[[c for c in frame.columns if c in columns]]
+        return frame
+
+    def save(self, name, fmt=OUTPUT_FORMAT, append=False):
+        # Two tables: <name>_market (every ticker-day) and <name>_mentions, both
+        # partitioned on date; append=True only (re)writes the dates in this panel
+        write = (lambda df, table: append_table(df, table, fmt=fmt, partition_on="date", sort_by=["ticker", "date"])) \
+            if append else (lambda df, table: write_table(df, table, fmt=fmt, partition_on="date"))
+        market_path = write(self.market_frame(), f"{name}_market")
+        write(self.mentions.assign(ticker=self.mentions["ticker"].astype(str)), f"{name}_mentions")
+        return market_path
+
+    @classmethod
+    def load(cls, name, start_date=None, end_date=None):
+        market = read_table(f"{name}_market", start_date=start_date, end_date=end_date, date_column="date")
+        market = market.assign(date=pd.to_datetime(market["date"]), ticker=market["ticker"].astype(str))
+        if table_exists(f"{name}_mentions"):
+            mentions = read_table(f"{name}_mentions", start_date=start_date, end_date=end_date, date_column="date")
+            mentions = mentions.assign(ticker=mentions["ticker"].astype(str))
+        else:
+            mentions = pd.DataFrame(columns=["date", "ticker"] + sentiment_cols + label_cols)
+        return cls.from_frames(market, mentions)
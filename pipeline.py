@@ -0,0 +1,265 @@
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Runs the whole workflow from one place:
+#   python pipeline.py                  run every stage that is out of date
+#   python pipeline.py panel            only `panel` and what it needs
+#   python pipeline.py --force labels   rerun `labels` even if nothing changed
+#   python pipeline.py --student finbert_student.joblib
+#                                       label with the distilled student, FinBERT only for uncertain texts
+#
+# Every stage declares the files/tables it reads and writes. Before a stage
+# runs, its inputs (file contents), parameters and code (the script or module
+# and every repo module it imports) are hashed; if the hash matches the last
+# successful run and the outputs still exist, the stage is skipped. Stages start
+# as soon as the stages producing their inputs are done, so independent ones
+# (market data and sentiment labeling) run at the same time.
+# Scripts run in their own process with the data directory as working directory.
+
+repo_dir = os.path.dirname(os.path.abspath(__file__))
+state_file = ".pipeline_state.json"
+
+
+class Stage:
+    def __init__(self, name, inputs=(), outputs=(), script=None, func=None, params=None, code=()):
+        # script: numbered script run as a subprocess; func: "module:function"
+        # called with **params. code: extra source files whose changes should
+        # rerun the stage (the script / function module and every repo module
+        # they import are always included).
+        self.name = name
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.script = script
+        self.func = func
+        self.params = params or {}
+        self.code = list(code)
+
+    def code_files(self):
+        main = self.script if self.script else self.func.split(":")[0] + ".py"
+        files = [os.path.join(repo_dir, f) for f in [main] + self.code]
+        todo = [f for f in files if f.endswith(".py")]
+        while todo:
+            for path in local_imports(todo.pop()):
+                if path not in files:
+                    files.append(path)
+                    todo.append(path)
+        return files
+
+    def run(self, workdir):
+        if self.script:
+            subprocess.run([sys.executable, os.path.join(repo_dir, self.script)], cwd=workdir, check=True)
+        else:
+            module, func = self.func.split(":")
+            # params go through argv as JSON (None/True/False are not Python literals in JSON)
+            code = f"import json, sys, {module}; {module}.{func}(**json.loads(sys.argv[1]))"
+            subprocess.run([sys.executable, "-c", code, json.dumps(self.params)], cwd=workdir, check=True,
+                           env={**os.environ, "PYTHONPATH": os.pathsep.join([repo_dir, os.environ.get("PYTHONPATH", "")])})
+
+def local_imports(path):
+    # Repo modules a source file imports, including imports inside functions
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split(".")[0])
+    paths = [os.path.join(repo_dir, f"{name}.py") for name in sorted(names)]
+    return [p for p in paths if os.path.exists(p)]
+
+
+def default_stages(model_path="finbert-finetuned", student_path=None):
+    # student_path: distilled student (distillation.py) that routes uncertain texts to FinBERT
+    label_inputs = [model_path] + ([student_path] if student_path else [])
+    label_params = {"model_path": model_path, **({"student_path": student_path} if student_path else {})}
+    return [
+        # Reddit crawl + ticker extraction (script 1 does both)
+        Stage("reddit", inputs=["russel_3000.csv"],
+              outputs=["wsb_arcticshift_submissions2023", "wsb_arcticshift_comments2023"],
+              script="1. ArcticShiftData.py"),
+        # FinBERT labels + consensus -> the tables script 3 reads
+        Stage("labels", inputs=["wsb_arcticshift_submissions2023", "wsb_arcticshift_comments2023"] + label_inputs,
+              outputs=["submissions_with_consensus", "comments_with_consensus"],
+              func="sentiment_labeling:label_tables", params=label_params),
+        Stage("market", outputs=["price_store", "price_store_ranges.json", "valid_tickers_closing_prices"],
+              script="2. GetFinanceData.py"),
+        Stage("panel", inputs=["submissions_with_consensus", "comments_with_consensus", "price_store", "price_store_ranges.json",
+                               "valid_tickers_closing_prices"],
+              outputs=["final_stock_sentiment_dataset2"],
+              script="3. MakeDataFile.py"),
+        # Classical models, walk-forward (5. ML-models.ipynb)
+        Stage("models", inputs=["final_stock_sentiment_dataset2"], outputs=["backtest_results"],
+              func="pipeline:train_models", params={"panel_name": "final_stock_sentiment_dataset2"}),
+    ]
+
+def train_models(panel_name):
+    from backtest import run_backtest
+    from panel import load_panel
+    run_backtest(load_panel(panel_name), first_test="2025-01-01", test_days=21, mode="expanding")
+
+# --- Hashing ---
+def resolve(path, workdir):
+    # Table names resolve to <name>.parquet or <name>.csv, whichever
+    # storage.read_table reads (the one written last)
+    from storage import stored_format, table_path
+
+    full = os.path.join(workdir, path)
+    if os.path.exists(full):
+        return full
+    fmt = stored_format(full)
+    return table_path(full, fmt) if fmt else None
+
+def file_digest(path, cache):
+    # Content hash, reused while size and mtime are unchanged (model weights are large)
+    stat = os.stat(path)
+    known = cache.get(path)
+    if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+        return known[2]
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    cache[path] = [stat.st_size, stat.st_mtime_ns, h.hexdigest()]
+    return cache[path][2]
+
+def path_digest(path, cache):
+    if os.path.isfile(path):
+        return file_digest(path, cache)
+    # Folders (partitioned tables, model directories): folder names and file
+    # contents count, file names do not (pyarrow names partition files randomly)
+    h = hashlib.blake2b(digest_size=16)
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        h.update(os.path.relpath(root, path).encode("utf-8"))
+        for digest in sorted(file_digest(os.path.join(root, name), cache) for name in files):
+            h.update(digest.encode("ascii"))
+    return h.hexdigest()
+
+def stage_key(stage, workdir, cache):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps(stage.params, sort_keys=True).encode("utf-8"))
+    for path in stage.code_files():
+        h.update(file_digest(path, cache).encode("ascii"))
+    for name in stage.inputs:
+        path = resolve(name, workdir)
+        h.update(name.encode("utf-8"))
+        h.update(path_digest(path, cache).encode("ascii") if path else b"missing")
+    return h.hexdigest()
+
+# --- Runner ---
+def producers(stages):
+    return {out: stage.name for stage in stages for out in stage.outputs}
+
+def needed(stages, targets):
+    # The targets plus every stage they depend on
+    by_name = {s.name: s for s in stages}
+    made_by = producers(stages)
+    wanted, todo = set(), list(targets)
+    while todo:
+        name = todo.pop()
+        if name in wanted:
+            continue
+        wanted.add(name)
+        todo.extend(made_by[i] for i in by_name[name].inputs if i in made_by)
+    return [s for s in stages if s.name in wanted]
+
+def load_state(workdir):
+    path = os.path.join(workdir, state_file)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {"stages": {}, "files": {}}
+
+def save_state(state, workdir):
+    with open(os.path.join(workdir, state_file), "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+
+def run_pipeline(stages=None, targets=None, force=(), workdir=".", max_workers=2):
+    stages = stages or default_stages()
+    if targets:
+        stages = needed(stages, targets)
+    made_by = producers(stages)
+    deps = {s.name: {made_by[i] for i in s.inputs if i in made_by} for s in stages}
+    state = load_state(workdir)
+    done, failed, running = set(), set(), {}  # running: name -> (future, key)
+    summary = {}
+
+    def start(stage):
+        # Hash once the inputs are final; skip if unchanged and outputs exist
+        key = stage_key(stage, workdir, state["files"])
+        last = state["stages"].get(stage.name, {})
+        outputs_exist = all(resolve(o, workdir) for o in stage.outputs)
+        if stage.name not in force and last.get("key") == key and outputs_exist:
+            print(f"✅ {stage.name}: unchanged, skipped")
+            summary[stage.name] = "skipped"
+            return None
+        print(f"🔄 {stage.name}: running")
+        return pool.submit(timed_run, stage, workdir), key
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while len(done) + len(failed) < len(stages):
+            for stage in stages:
+                name = stage.name
+                if name in done or name in failed or name in running:
+                    continue
+                if deps[name] & failed:
+                    print(f"⚠️ {name}: not run, an input stage failed")
+                    failed.add(name)
+                    summary[name] = "blocked"
+                elif deps[name] <= done:
+                    started = start(stage)
+                    if started is None:
+                        done.add(name)
+                    else:
+                        running[name] = started
+            if not running:
+                continue
+
+            finished, _ = wait([future for future, _ in running.values()], return_when=FIRST_COMPLETED)
+            for name, (future, key) in list(running.items()):
+                if future not in finished:
+                    continue
+                del running[name]
+                try:
+                    seconds = future.result()
+                except subprocess.CalledProcessError as e:
+                    print(f"❌ {name}: failed ({e})")
+                    failed.add(name)
+                    summary[name] = "failed"
+                    continue
+                state["stages"][name] = {"key": key, "seconds": seconds,
+                                         "finished": time.strftime("%Y-%m-%d %H:%M:%S")}
+                save_state(state, workdir)
+                print(f"✅ {name}: done in {seconds:.1f}s")
+                done.add(name)
+                summary[name] = "ran"
+    save_state(state, workdir)
+    return summary
+
+def timed_run(stage, workdir):
+    start = time.perf_counter()
+    stage.run(workdir)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    student_path = None
+    if "--student" in args:
+        i = args.index("--student")
+        student_path = args[i + 1]
+        del args[i:i + 2]
+    stages = default_stages(student_path=student_path)
+    force = set()
+    if "--force" in args:
+        args.remove("--force")
+        force = set(args) or {s.name for s in stages}
+    summary = run_pipeline(stages, targets=args or None, force=force)
+    sys.exit(1 if any(v in ("failed", "blocked") for v in summary.values()) else 0)
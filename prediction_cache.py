@@ -0,0 +1,120 @@
+import hashlib
+import json
+import math
+import sqlite3
+import time
+import unicodedata
+
+# On-disk cache of sentiment predictions (SQLite). Entries are keyed by a hash of
+# the normalized text plus a model id, so a re-run only has to score texts that
+# are new since the last crawl, and the accuracy notebook can read every model's
+# predictions back without running anything. When the cache holds more than
+# max_entries predictions the least recently used ones are removed.
+
+# Model ids used in the keys - bump the version after retraining or changing a
+# model, its old predictions are then simply not found any more
+models = {
+    "finbert": "finbert-finetuned@1",
+    "bert": "bert-sentiment@1",
+    "roberta": "roberta-sentiment@1",
+    "vader": "vader-compound@1",
+}
+
+def normalize_text(text):
+    # Same text up to unicode form and whitespace -> same key
+    text = unicodedata.normalize("NFKC", str(text))
+    return " ".join(text.split())
+
+def text_key(text):
+    return hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=16).digest()
+
+def is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class PredictionCache:
+    def __init__(self, path="prediction_cache.sqlite", max_entries=10_000_000, chunk_size=500):
+        self.path = path
+        self.max_entries = max_entries
+        self.chunk_size = chunk_size  # keys per query, below SQLite's variable limit
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS predictions ("
+            "key BLOB, model TEXT, value TEXT, last_used REAL, PRIMARY KEY (key, model)"
+            ") WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS predictions_last_used ON predictions(last_used)")
+        self.conn.commit()
+
+    def get_many(self, texts, model):
+        # One value per text, None where the cache has no prediction
+        keys = [text_key(t) for t in texts]
+        found = {}
+        unique = list(dict.fromkeys(keys))
+        for i in range(0, len(unique), self.chunk_size):
+            chunk = unique[i:i + self.chunk_size]
+            marks = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT key, value FROM predictions WHERE model = ? AND key IN ({marks})", [model, *chunk]
+            ).fetchall()
+            found.update((key, json.loads(value)) for key, value in rows)
+
+        now = time.time()
+        self.conn.executemany(
+            "UPDATE predictions SET last_used = ? WHERE key = ? AND model = ?",
+            [(now, key, model) for key in found],
+        )
+        self.conn.commit()
+        return [found.get(key) for key in keys]
+
+    def put_many(self, texts, values, model):
+        # Missing values (None/NaN) are not stored
+        now = time.time()
+        rows = [
+            (text_key(t), model, json.dumps(getattr(v, "item", lambda: v)()), now)
+            for t, v in zip(texts, values) if not is_missing(v)
+        ]
+        self.conn.executemany("INSERT OR REPLACE INTO predictions VALUES (?, ?, ?, ?)", rows)
+        self.conn.commit()
+        self.evict()
+        return len(rows)
+
+    def evict(self):
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM predictions").fetchone()
+        if count <= self.max_entries:
+            return 0
+        extra = count - self.max_entries
+        self.conn.execute(
+            "DELETE FROM predictions WHERE (key, model) IN "
+            "(SELECT key, model FROM predictions ORDER BY last_used LIMIT ?)", (extra,)
+        )
+        self.conn.commit()
+        return extra
+
+    def count(self, model=None):
+        if model is None:
+            return self.conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+        return self.conn.execute("SELECT COUNT(*) FROM predictions WHERE model = ?", (model,)).fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+def cached_predict(cache, texts, model, predict_fn):
+    # Runs predict_fn (list of texts -> list of predictions) only on texts the
+    # cache has not seen for this model; each distinct text is scored once
+    texts = [str(t) for t in texts]
+    values = cache.get_many(texts, model)
+    misses = {}
+    for text, value in zip(texts, values):
+        if value is None:
+            misses.setdefault(text_key(text), text)
+    print(f"✅ {len(texts) - sum(v is None for v in values)} of {len(texts)} {model} predictions cached, {len(misses)} texts to score")
+
+    if misses:
+        new_texts = list(misses.values())
+        new_values = list(predict_fn(new_texts))
+        cache.put_many(new_texts, new_values, model)
+        by_key = dict(zip(misses, new_values))
+        values = [by_key[text_key(t)] if v is None else v for t, v in zip(texts, values)]
+    return values
@@ -0,0 +1,243 @@
+import json
+import os
+import time
+import pandas as pd
+from instrumentation import current
+from storage import OUTPUT_FORMAT, day_string, read_table, table_exists, write_table
+
+# Local price/volume store keyed by (ticker, date). For every ticker it remembers
+# which [start, end) ranges have been downloaded (a sorted list of disjoint
+# ranges), so an update only fetches the days that are missing and a new ticker
+# is backfilled on its own. A ticker the provider returns nothing for is not
+# recorded, so the next update tries it again. Ranges are recorded up to today
+# at most (today's bar may be partial); within the last `settle_days` days only
+# up to the last bar that came back, since recent bars may not be published yet.
+# Closes are split/dividend adjusted; when a new range has a corporate action,
+# the ticker's stored history is fetched again so all closes share one basis.
+
+settle_days = 5
+
+# --- Data sources ---
+class PriceProvider:
+    # fetch returns a long frame with columns: ticker, date, closing_price, volume
+    # (+ optionally corporate_action: True on split/dividend days)
+    def fetch(self, tickers, start_date, end_date):
+        raise NotImplementedError
+
+
+class YFinanceProvider(PriceProvider):
+    def __init__(self, chunk_size=50):
+        self.chunk_size = chunk_size  # Smaller chunk to reduce risk of throttling
+
+    def fetch(self, tickers, start_date, end_date):
+        import yfinance as yf
+
+        frames = []
+        for i in range(0, len(tickers), self.chunk_size):
+            chunk = tickers[i:i + self.chunk_size]
+            start = time.perf_counter()
+            chunk_data = yf.download(
+                tickers=chunk,
+                start=start_date,
+                end=end_date,
+                interval="1d",
+                group_by="ticker",
+                auto_adjust=True,
+                actions=True,
+                threads=True,
+                progress=True
+            )
+            run = current()
+            if run:
+                run.record_call("yfinance download", [time.perf_counter() - start], ok=not chunk_data.empty)
+            for ticker in chunk:
+                try:
+                    df = chunk_data[ticker]
+                    actions = [c for c in ("Dividends", "Stock Splits") if c in df.columns]
+                    df = df[["Close", "Volume"] + actions].dropna(subset=["Close", "Volume"], how="all")
+                except KeyError:
+                    print(f"⚠️ Missing data for {ticker}")
+                    continue
+                frames.append(pd.DataFrame({
+                    "ticker": ticker,
+                    "date": pd.to_datetime(df.index).normalize(),
+                    "closing_price": df["Close"].to_numpy(),
+                    "volume": df["Volume"].to_numpy(),
+                    "corporate_action": (df[actions].fillna(0) != 0).any(axis=1).to_numpy(),
+                }))
+        return pd.concat(frames, ignore_index=True) if frames else empty_prices()
+
+
+class FileProvider(PriceProvider):
+    # Serves prices from wide closing price / volume tables (e.g. the old
+    # valid_tickers_*.csv files), so the store can be used without yfinance
+    def __init__(self, closing_name="valid_tickers_closing_prices", volume_name="valid_tickers_volumes"):
+        close = read_table(closing_name).melt(id_vars=["Date"], var_name="ticker", value_name="closing_price")
+        volume = read_table(volume_name).melt(id_vars=["Date"], var_name="ticker", value_name="volume")
+        prices = close.merge(volume, on=["Date", "ticker"], how="outer").rename(columns={"Date": "date"})
+        prices["date"] = pd.to_datetime(prices["date"]).dt.normalize()
+        self.prices = prices.dropna(subset=["closing_price", "volume"], how="all")
+
+    def fetch(self, tickers, start_date, end_date):
+        p = self.prices
+        mask = p["ticker"].isin(tickers) & (p["date"] >= pd.Timestamp(start_date)) & (p["date"] < pd.Timestamp(end_date))
+        return p[mask].reset_index(drop=True)
+
+
+def recorded_end(end, last_bar, today=None):
+    # End of a fetched range that counts as downloaded: never past today, and
+    # for the last settle_days days only up to the day after the last bar
+    today = pd.Timestamp.today().normalize() if today is None else pd.Timestamp(today)
+    settled = today - pd.Timedelta(days=settle_days)
+    end = min(pd.Timestamp(end), today, max(pd.Timestamp(last_bar) + pd.Timedelta(days=1), settled))
+    return end.strftime("%Y-%m-%d")
+
+
+def empty_prices():
+    return pd.DataFrame({
+        "ticker": pd.Series(dtype="object"),
+        "date": pd.Series(dtype="datetime64[ns]"),
+        "closing_price": pd.Series(dtype="float64"),
+        "volume": pd.Series(dtype="float64"),
+    })
+
+
+# --- Store ---
+class PriceStore:
+    def __init__(self, name="price_store", fmt=OUTPUT_FORMAT):
+        self.name = name
+        self.fmt = fmt
+        self.ranges_path = f"{name}_ranges.json"
+        if table_exists(name):
+            self.prices = read_table(name)
+            self.prices["date"] = pd.to_datetime(self.prices["date"])
+        else:
+            self.prices = empty_prices()
+        self.ranges = {}
+        if os.path.exists(self.ranges_path):
+            with open(self.ranges_path, encoding="utf-8") as f:
+                self.ranges = json.load(f)
+
+    def covered(self, ticker):
+        # Downloaded [start, end) ranges of a ticker; older files hold a single [start, end]
+        ranges = self.ranges.get(ticker, [])
+        if ranges and not isinstance(ranges[0], list):
+            ranges = [ranges]
+        return [list(r) for r in ranges]
+
+    def missing_ranges(self, ticker, start_date, end_date):
+        # Parts of [start_date, end_date) not downloaded yet for this ticker
+        missing = []
+        cursor = start_date
+        for have_start, have_end in self.covered(ticker):
+            if have_end <= cursor:
+                continue
+            if have_start >= end_date:
+                break
+            if have_start > cursor:
+                missing.append((cursor, have_start))
+            cursor = max(cursor, have_end)
+        if cursor < end_date:
+            missing.append((cursor, end_date))
+        return missing
+
+    def add_range(self, ticker, start, end):
+        # Only ranges that overlap or touch are merged, gaps stay missing
+        merged = []
+        for have_start, have_end in sorted(self.covered(ticker) + [[start, end]]):
+            if merged and have_start <= merged[-1][1]:
+                merged[-1][1] = max(merged[-1][1], have_end)
+            else:
+                merged.append([have_start, have_end])
+        self.ranges[ticker] = merged
+
+    def update(self, provider, tickers, start_date, end_date):
+        # Tickers missing the same range are downloaded together
+        requests = {}
+        for ticker in tickers:
+            for missing in self.missing_ranges(ticker, start_date, end_date):
+                requests.setdefault(missing, []).append(ticker)
+        if not requests:
+            print("✅ Price store is up to date")
+            return self
+
+        fetched, rebase = self._fetch(provider, requests)
+        prices = self.prices
+        if rebase:
+            # Adjusted closes before a split/dividend are rescaled by the provider,
+            # so the stored history of these tickers is on the old basis: fetch
+            # it again instead of mixing the two
+            print(f"🔄 Refetching the stored history of {len(rebase)} tickers with a split or dividend in the new range")
+            requests = {}
+            for ticker, (stored, added) in rebase.items():
+                self.ranges[ticker] = []
+                for start, end in added:
+                    self.add_range(ticker, start, end)
+                for start, end in stored:
+                    requests.setdefault((start, end), []).append(ticker)
+            prices = prices[~prices["ticker"].isin(list(rebase))]
+            fetched += self._fetch(provider, requests)[0]
+
+        prices = pd.concat([f for f in [prices] + fetched if not f.empty], ignore_index=True)
+        self.prices = (
+            prices.drop_duplicates(["ticker", "date"], keep="last")
+            .sort_values(["ticker", "date"])
+            .reset_index(drop=True)
+        )
+        self.save()
+        return self
+
+    def _fetch(self, provider, requests):
+        # Downloads {(start, end): tickers}. Also returns the tickers with a
+        # corporate action in a new range after the start of their stored
+        # history: {ticker: (stored ranges, ranges fetched now)}
+        fetched = []
+        stored = {}
+        added = {}
+        rebase = set()
+        for (start, end), batch in requests.items():
+            print(f"🔄 Fetching {len(batch)} tickers for {start} → {end}")
+            frame = provider.fetch(batch, start, end)
+            if "corporate_action" in frame.columns:
+                actions = frame[frame["corporate_action"].astype(bool)].groupby("ticker")["date"].max()
+                for ticker, date in actions.items():
+                    history = stored.get(ticker, self.covered(ticker))
+                    if any(have_start < day_string(date) for have_start, _ in history):
+                        rebase.add(ticker)
+                frame = frame.drop(columns="corporate_action")
+            fetched.append(frame)
+            last_bar = frame.groupby("ticker")["date"].max()
+            for ticker in batch:
+                if ticker in last_bar.index and recorded_end(end, last_bar[ticker]) > start:
+                    stored.setdefault(ticker, self.covered(ticker))
+                    added.setdefault(ticker, []).append([start, recorded_end(end, last_bar[ticker])])
+                    self.add_range(ticker, *added[ticker][-1])
+            returned = set(last_bar.index)
+            if len(returned) < len(batch):
+                print(f"⚠️ No data for {len(batch) - len(returned)} tickers, they are tried again next update")
+        return fetched, {ticker: (stored[ticker], added[ticker]) for ticker in rebase}
+
+    def save(self):
+        write_table(self.prices, self.name, fmt=self.fmt)
+        with open(self.ranges_path, "w", encoding="utf-8") as f:
+            json.dump(self.ranges, f, indent=1, sort_keys=True)
+
+    def long(self, tickers=None, start_date=None, end_date=None):
+        p = self.prices
+        mask = pd.Series(True, index=p.index)
+        if tickers is not None:
+            mask &= p["ticker"].isin(tickers)
+        if start_date:
+            mask &= p["date"] >= pd.Timestamp(start_date)
+        if end_date:
+            mask &= p["date"] < pd.Timestamp(end_date)
+        return p[mask].reset_index(drop=True)
+
+    def wide(self, field, tickers=None, start_date=None, end_date=None):
+        # Same layout as the old valid_tickers_*.csv files: Date + one column per ticker
+        p = self.long(tickers, start_date, end_date)
+        wide = p.pivot(index="date", columns="ticker", values=field)
+        if tickers is not None:
+            wide = wide.reindex(columns=[t for t in tickers if t in wide.columns])
+        wide.columns.name = None
+        return wide.rename_axis("Date").reset_index()
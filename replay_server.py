@@ -0,0 +1,107 @@
+import datetime as dt
+import json
+import sys
+import time
+from aiohttp import web
+
+# Local stand-in for the ArcticShift API. Serves pages recorded with
+# ArcticShiftClient(record_path=...) so crawls can be re-run offline:
+#   python replay_server.py recorded_pages.jsonl 8080
+#   ArcticShiftClient(base_url="http://localhost:8080")
+#
+# With a speed the recording is played back as a live feed for live_stream.py:
+#   python replay_server.py recorded_pages.jsonl 8080 60    (one recorded minute per second)
+# Every recorded post/comment becomes visible once the replay clock passes its
+# created_utc, and searches are answered from those items (after/before,
+# link_id, author, limit), not from the recorded pages.
+
+def page_key(path, params):
+    return path, tuple(sorted((k, str(v)) for k, v in params.items()))
+
+def load_pages(record_path):
+    pages = {}
+    with open(record_path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            pages[page_key(record["path"], record["params"])] = record["response"]
+    return pages
+
+def make_app(pages):
+    async def handle(request):
+        # Unknown queries get an empty page, which ends the client's pagination
+        response = pages.get(page_key(request.path, request.query), {"data": []})
+        return web.json_response(response)
+
+    app = web.Application()
+    app.router.add_get("/api/{kind}/search", handle)
+    return app
+
+# --- Live replay ---
+def load_items(record_path):
+    # {"posts": [...], "comments": [...]} from every recorded page, by created_utc
+    items = {"posts": {}, "comments": {}}
+    with open(record_path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            kind = "comments" if "comments" in record["path"] else "posts"
+            for item in record["response"].get("data", []):
+                items[kind][item["id"]] = item
+    return {kind: sorted(found.values(), key=lambda x: x["created_utc"]) for kind, found in items.items()}
+
+def to_epoch(value):
+    # The client sends epoch seconds (comments) or "YYYY-MM-DD HH:MM:SS" in UTC (posts)
+    if value.isdigit():
+        return int(value)
+    parsed = dt.datetime.strptime(value, "%Y-%m-%d %H:%M:%S").replace(tzinfo=dt.timezone.utc)
+    return int(parsed.timestamp())
+
+class ReplayClock:
+    # Recorded time, starting at `start` (default: the first item) and running `speed` times real time
+    def __init__(self, start, speed=1.0):
+        self.start = start
+        self.speed = speed
+        self.started = time.monotonic()
+
+    def now(self):
+        return self.start + (time.monotonic() - self.started) * self.speed
+
+def make_live_app(items, speed=1.0, start=None):
+    first = min((found[0]["created_utc"] for found in items.values() if found), default=0)
+    clock = ReplayClock(start if start is not None else first, speed)
+
+    async def handle(request):
+        kind = "comments" if request.match_info["kind"] == "comments" else "posts"
+        query = request.query
+        now = clock.now()
+        after = to_epoch(query["after"]) if "after" in query else None
+        before = to_epoch(query["before"]) if "before" in query else None
+        limit = 100 if query.get("limit", "auto") == "auto" else int(query["limit"])
+
+        data = []
+        for item in items[kind]:
+            created = item["created_utc"]
+            if created > now:
+                break
+            if (after is not None and created <= after) or (before is not None and created >= before):
+                continue
+            if "link_id" in query and item.get("link_id") != query["link_id"]:
+                continue
+            if "author" in query and item.get("author") != query["author"]:
+                continue
+            data.append(item)
+            if len(data) == limit:
+                break
+        return web.json_response({"data": data})
+
+    app = web.Application()
+    app.router.add_get("/api/{kind}/search", handle)
+    app["clock"] = clock
+    return app
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8080
+    if len(sys.argv) > 3:
+        web.run_app(make_live_app(load_items(sys.argv[1]), speed=float(sys.argv[3])), port=port)
+    else:
+        web.run_app(make_app(load_pages(sys.argv[1])), port=port)
@@ -0,0 +1,232 @@
+import json
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from backtest import categorical_features, numeric_features
+from instrumentation import Histogram, latency_buckets_ms
+
+# Daily scoring with the models trained in 5. ML-models.ipynb and 7. LSTM.ipynb,
+# without reloading the panel CSV or refitting anything. The panel is written
+# once as a memory-mapped (date, ticker, feature) float32 array plus an index
+# (dates, tickers, feature names):
+#
+#   python scoring_service.py build final_stock_sentiment_dataset2
+#
+# The notebooks save their fitted models with save_model (the feature columns
+# they were trained on, and the MinMaxScaler and window length for the LSTM).
+# ScoringService loads the cube and every saved model once; score(date) then
+# reads the one date slice (or the last `window` slices for the LSTM) and runs
+# one predict call per model for all tickers, giving the probability that each
+# ticker goes up the next trading day:
+#
+#   python scoring_service.py score 2025-03-31     # prints predictions and latency
+#   python scoring_service.py serve 8090           # GET /predict?date=..., GET /stats
+#
+# Features are encoded like FeatureMatrix (avg_num_comments and the flair
+# filled in, one dummy column per category); a model's columns are picked from
+# the cube by name, so drop_first encodings work unchanged. Ticker-days that
+# are missing or have missing features get NaN. Rebuild the cube when the panel
+# gets new days.
+
+cube_dir = "feature_cube"
+model_dir = "models"
+
+# --- Cube ---
+def encode(panel):
+    panel = panel.assign(
+        avg_num_comments=panel["avg_num_comments"].fillna(0),
+        most_mentioned_link_flair_text=panel["most_mentioned_link_flair_text"].fillna("unknown"),
+    )
+    encoded = pd.get_dummies(panel[categorical_features])
+    return pd.concat([panel[numeric_features], encoded], axis=1)
+
+def build_cube(panel, path=cube_dir):
+    features = encode(panel)
+    d_idx, dates = pd.factorize(pd.to_datetime(panel["date"]), sort=True)
+    t_idx, tickers = pd.factorize(panel["ticker"].astype(str), sort=True)
+
+    os.makedirs(path, exist_ok=True)
+    cube = np.lib.format.open_memmap(
+        os.path.join(path, "cube.npy"), mode="w+", dtype=np.float32,
+        shape=(len(dates), len(tickers), features.shape[1])
+    )
+    cube[:] = np.nan
+    cube[d_idx, t_idx] = features.to_numpy(dtype=np.float32, na_value=np.nan)
+    cube.flush()
+
+    index = {
+        "dates": [d.strftime("%Y-%m-%d") for d in dates],
+        "tickers": list(tickers),
+        "features": list(features.columns),
+    }
+    with open(os.path.join(path, "index.json"), "w") as f:
+        json.dump(index, f)
+    print(f"✅ Feature cube {cube.shape} written to {path}/ ({cube.nbytes / 2**20:.1f} MB)")
+    return cube
+
+class FeatureCube:
+    def __init__(self, path=cube_dir):
+        with open(os.path.join(path, "index.json")) as f:
+            index = json.load(f)
+        self.dates = index["dates"]
+        self.tickers = np.array(index["tickers"])
+        self.features = index["features"]
+        self.position = {date: i for i, date in enumerate(self.dates)}
+        self.cube = np.load(os.path.join(path, "cube.npy"), mmap_mode="r")
+
+    def columns(self, names):
+        # Cube positions of a model's columns (-1: category not in the cube -> 0)
+        lookup = {name: i for i, name in enumerate(self.features)}
+        return np.array([lookup.get(name, -1) for name in names])
+
+    def day(self, date=None):
+        # Position of a date; default is the last day in the cube
+        date = self.dates[-1] if date is None else pd.Timestamp(date).strftime("%Y-%m-%d")
+        if date not in self.position:
+            raise KeyError(f"{date} is not in the feature cube ({self.dates[0]} to {self.dates[-1]})")
+        return self.position[date]
+
+    def window(self, day, length, columns):
+        # (ticker, length, feature) block ending at day; copies only those slices
+        block = self.cube[max(0, day - length + 1):day + 1]
+        block = block[:, :, np.maximum(columns, 0)]
+        block[:, :, columns < 0] = 0
+        if len(block) < length:
+            pad = np.full((length - len(block),) + block.shape[1:], np.nan, dtype=np.float32)
+            block = np.concatenate([pad, block])
+        return block.transpose(1, 0, 2)
+
+# --- Models ---
+def _is_keras(model):
+    return type(model).__module__.split(".")[0] in ("keras", "tensorflow", "tf_keras")
+
+def save_model(model, columns, name, path=model_dir, scaler=None, window=None):
+    # Fitted sklearn/XGBoost model (or Keras LSTM with its scaler and window) for ScoringService
+    import joblib
+
+    os.makedirs(path, exist_ok=True)
+    kind = "keras" if _is_keras(model) else "sklearn"
+    if kind == "keras":
+        model.save(os.path.join(path, f"{name}.keras"))
+        joblib.dump({"scaler": scaler}, os.path.join(path, f"{name}.joblib"))
+    else:
+        joblib.dump({"model": model, "scaler": scaler}, os.path.join(path, f"{name}.joblib"))
+    with open(os.path.join(path, f"{name}.json"), "w") as f:
+        json.dump({"kind": kind, "columns": list(columns), "window": window}, f)
+    print(f"✅ Saved {name} ({kind}) to {path}/")
+
+def load_model(name, path=model_dir):
+    import joblib
+
+    with open(os.path.join(path, f"{name}.json")) as f:
+        meta = json.load(f)
+    bundle = joblib.load(os.path.join(path, f"{name}.joblib"))
+    if meta["kind"] == "keras":
+        from tensorflow import keras
+        bundle["model"] = keras.models.load_model(os.path.join(path, f"{name}.keras"))
+    return {**meta, **bundle}
+
+# --- Service ---
+class ScoringService:
+    def __init__(self, cube_path=cube_dir, models_path=model_dir, names=None):
+        started = time.perf_counter()
+        self.cube = FeatureCube(cube_path)
+        if names is None:
+            names = sorted(f[:-5] for f in os.listdir(models_path) if f.endswith(".json"))
+        self.models = {}
+        self.load_seconds = {}
+        for name in names:
+            t0 = time.perf_counter()
+            model = load_model(name, models_path)
+            model["positions"] = self.cube.columns(model["columns"])
+            self.models[name] = model
+            self.load_seconds[name] = time.perf_counter() - t0
+        self.startup_seconds = time.perf_counter() - started
+        self.latency = Histogram(latency_buckets_ms)
+        self.model_latency = {name: Histogram(latency_buckets_ms) for name in self.models}
+
+    def _predict(self, model, day):
+        columns = model["columns"]
+        if model["kind"] == "keras":
+            X = self.cube.window(day, model["window"], model["positions"])
+        else:
+            X = self.cube.window(day, 1, model["positions"])[:, 0]
+        valid = ~np.isnan(X.reshape(len(X), -1)).any(axis=1)
+        proba = np.full(len(X), np.nan)
+        if not valid.any():
+            return proba
+
+        X = X[valid]
+        if model["scaler"] is not None:
+            scaled = model["scaler"].transform(pd.DataFrame(X.reshape(-1, len(columns)), columns=columns))
+            X = np.asarray(scaled, dtype=np.float32).reshape(X.shape)
+        if model["kind"] == "keras":
+            # One batch: calling the model skips predict()'s per-call dataset setup
+            proba[valid] = np.asarray(model["model"](X, training=False)).ravel()
+        else:
+            proba[valid] = model["model"].predict_proba(pd.DataFrame(X, columns=columns))[:, 1]
+        return proba
+
+    def score(self, date=None):
+        # Next-day up probability per ticker and model for one date
+        started = time.perf_counter()
+        day = self.cube.day(date)
+        out = pd.DataFrame({"date": self.cube.dates[day], "ticker": self.cube.tickers})
+        for name, model in self.models.items():
+            t0 = time.perf_counter()
+            out[name] = self._predict(model, day)
+            self.model_latency[name].add((time.perf_counter() - t0) * 1000)
+        self.last_ms = (time.perf_counter() - started) * 1000
+        self.latency.add(self.last_ms)
+        return out
+
+    def stats(self):
+        return {
+            "cube_shape": list(self.cube.cube.shape),
+            "first_date": self.cube.dates[0],
+            "last_date": self.cube.dates[-1],
+            "startup_seconds": round(self.startup_seconds, 3),
+            "load_seconds": {name: round(s, 3) for name, s in self.load_seconds.items()},
+            "score_ms": self.latency.to_dict(),
+            "model_ms": {name: h.to_dict() for name, h in self.model_latency.items()},
+        }
+
+def make_app(service):
+    from aiohttp import web
+
+    async def predict(request):
+        try:
+            scores = service.score(request.query.get("date"))
+        except KeyError as e:
+            return web.json_response({"error": str(e.args[0])}, status=404)
+        scores = scores.astype(object).where(scores.notna(), None)
+        return web.json_response({"latency_ms": round(service.last_ms, 2), "predictions": scores.to_dict("records")})
+
+    async def stats(request):
+        return web.json_response(service.stats())
+
+    app = web.Application()
+    app.router.add_get("/predict", predict)
+    app.router.add_get("/stats", stats)
+    return app
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "score"
+    if command == "build":
+        from panel import load_panel
+        build_cube(load_panel(sys.argv[2]), sys.argv[3] if len(sys.argv) > 3 else cube_dir)
+        sys.exit(0)
+
+    service = ScoringService()
+    print(f"⏱️ Startup: {service.startup_seconds:.2f}s (cube {service.cube.cube.shape}, models: {', '.join(service.models)})")
+    if command == "serve":
+        from aiohttp import web
+        web.run_app(make_app(service), port=int(sys.argv[2]) if len(sys.argv) > 2 else 8090)
+    else:
+        for date in sys.argv[2:] or [None]:
+            scores = service.score(date)
+            print(scores.to_string(index=False))
+            print(f"⏱️ Scored {len(scores)} tickers for {scores['date'].iloc[0]} in {service.last_ms:.1f} ms")
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from instrumentation import hot
+
+# Vectorized versions of the sentiment aggregation in 3. MakeDataFile.py.
+# Everything is done with column operations and groupby sums instead of
+# row-wise apply and Python lambdas; the output is the same.
+
+consensus_labels = ("positive", "neutral", "negative")
+sentiment_mapping = {"positive": 1, "neutral": 0, "negative": -1}
+
+def add_like_scores(df):
+    consensus = df["consensus"].to_numpy()
+    score = df["score"].to_numpy()
+    df["like_score_positive"] = np.where(consensus == "positive", score, 0)
+    df["like_score_negative"] = np.where(consensus == "negative", score, 0)
+    return df
+
+def consensus_label(positive, negative):
+    return np.select([positive > negative, negative > positive], ["positive", "negative"], "equal")
+
+def weights(df):
+    # Optional "weight" column: a comment standing for cluster_size near-duplicates
+    # (comment_pipeline.py) counts that many times; rows without one count once
+    if "weight" not in df.columns:
+        return np.ones(len(df), dtype="int64")
+    return df["weight"].fillna(1).to_numpy(dtype="int64")
+
+def count_consensus(df, keys, suffix=""):
+    # One-hot the consensus labels and sum them per group
+    consensus = df["consensus"].to_numpy()
+    weight = weights(df)
+    onehot = pd.DataFrame({key: df[key].to_numpy() for key in keys})
+    for label in consensus_labels:
+        onehot[f"no_{label}_consensus{suffix}"] = (consensus == label) * weight
+    return onehot.groupby(keys).sum()
+
+def most_common(df, keys, column):
+    # Per-group mode; ties go to the smallest value, like Series.mode().iloc[0]
+    values = df[keys + [column]].dropna(subset=[column])
+    counts = values.groupby(keys + [column]).size().reset_index(name="n")
+    counts = counts.sort_values(["n", column], ascending=[False, True], kind="mergesort")
+    return counts.drop_duplicates(keys).set_index(keys)[column]
+
+@hot
+def calc_sentiment_metrics(df):
+    keys = ["date", "ticker"]
+    result = count_consensus(df, keys)
+
+    sums = df[keys + ["like_score_positive", "like_score_negative"]].groupby(keys).sum()
+    result["like_score_positive"] = sums["like_score_positive"]
+    result["like_score_negative"] = sums["like_score_negative"]
+    result["avg_num_comments"] = df[keys + ["num_comments"]].groupby(keys)["num_comments"].mean()
+    result["most_mentioned_link_flair_text"] = most_common(df, keys, "link_flair_text")
+    result["number_of_mentions"] = df[keys].assign(n=weights(df)).groupby(keys)["n"].sum()
+    result = result.reset_index()
+
+    result["ticker_consensus_label"] = consensus_label(
+        result["no_positive_consensus"].to_numpy(), result["no_negative_consensus"].to_numpy()
+    )
+    return result
+
+@hot
+def calc_general_sentiment(comments, submissions):
+    # Sentiment of posts and comments that mention no ticker, per date
+    comments_general = comments[comments["tickers_mentioned"].str.len().eq(0).to_numpy()]
+    submissions_general = submissions[submissions["companies_mentioned"].str.len().eq(0).to_numpy()]
+    columns = ["date", "consensus_score"] + (["weight"] if "weight" in comments.columns else [])
+    combined_general = pd.concat([
+        comments_general[columns],
+        submissions_general[["date", "consensus_score"]]
+    ]).rename(columns={"consensus_score": "consensus"})
+
+    general_sentiment = count_consensus(combined_general, ["date"], suffix="_general").reset_index()
+    general_sentiment["general_consensus_label"] = consensus_label(
+        general_sentiment["no_positive_consensus_general"].to_numpy(),
+        general_sentiment["no_negative_consensus_general"].to_numpy()
+    )
+    return general_sentiment
@@ -0,0 +1,159 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from instrumentation import hot, stage
+
+# CPU inference for the fine-tuned FinBERT (finetune_nlp.ipynb). Texts are sorted
+# by token length and cut into batches by a token budget (batch size x longest
+# text), so short comments run in large batches with almost no padding and long
+# posts in small ones. Batches can be spread over several processes and the
+# weights can be dynamically int8-quantized or exported to ONNX. Labels come
+# back in the order of the input texts.
+
+int_to_label = {0: "negative", 1: "neutral", 2: "positive"}
+
+def load_model(model_path, quantize=False, onnx=False):
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    if onnx:
+        # Needs `pip install optimum[onnxruntime]`
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        model = ORTModelForSequenceClassification.from_pretrained(model_path, export=True)
+        return tokenizer, model
+
+    import torch
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+    if quantize:
+        # int8 weights for the Linear layers, activations quantized on the fly
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return tokenizer, model
+
+def token_lengths(tokenizer, texts, max_length=512, chunk_size=10000):
+    # Only the lengths are kept, the ids are tokenized again per batch
+    lengths = np.empty(len(texts), dtype=np.int32)
+    for i in range(0, len(texts), chunk_size):
+        ids = tokenizer(texts[i:i + chunk_size], truncation=True, max_length=max_length)["input_ids"]
+        lengths[i:i + len(ids)] = [len(x) for x in ids]
+    return lengths
+
+def make_batches(lengths, token_budget=8192, max_batch_size=256):
+    # Indices sorted by length, cut so that rows x longest row stays within the budget
+    order = np.argsort(lengths, kind="stable")
+    batches, batch = [], []
+    for idx in order:
+        if batch and ((len(batch) + 1) * lengths[idx] > token_budget or len(batch) == max_batch_size):
+            batches.append(batch)
+            batch = []
+        batch.append(int(idx))
+    if batch:
+        batches.append(batch)
+    return batches
+
+@hot
+def predict_batch(tokenizer, model, texts, max_length=512, device="cpu"):
+    import torch
+
+    encodings = tokenizer(texts, truncation=True, padding=True, max_length=max_length, return_tensors="pt")
+    if device != "cpu":
+        encodings = {k: v.to(device) for k, v in encodings.items()}
+    with torch.inference_mode():
+        logits = model(**encodings).logits
+    return logits.argmax(dim=-1).tolist()
+
+# --- Worker processes ---
+_tokenizer = None
+_model = None
+
+def _init_worker(model_path, quantize, onnx, threads):
+    global _tokenizer, _model
+    import torch
+    torch.set_num_threads(threads)
+    _tokenizer, _model = load_model(model_path, quantize=quantize, onnx=onnx)
+
+def _predict_batches(batches, max_length):
+    return [predict_batch(_tokenizer, _model, texts, max_length) for texts in batches]
+
+
+class SentimentEngine:
+    def __init__(self, model_path, quantize=False, onnx=False, token_budget=8192,
+                 max_batch_size=256, workers=1, max_length=512, device="cpu"):
+        # device: only used with workers=1 and plain torch weights (e.g. "cuda" on Colab)
+        self.model_path = model_path
+        self.quantize = quantize
+        self.onnx = onnx
+        self.token_budget = token_budget
+        self.max_batch_size = max_batch_size
+        self.workers = workers
+        self.max_length = max_length
+        self.device = device
+        self.tokenizer, self.model = load_model(model_path, quantize=quantize, onnx=onnx) if workers == 1 else (None, None)
+        if device != "cpu" and self.model is not None:
+            self.model.to(device)
+        self.stats = {}
+
+    def predict(self, texts):
+        # Returns one label ("negative"/"neutral"/"positive") per text, in input order
+        texts = [str(t) for t in texts]
+        with stage("sentiment_inference", rows_in=len(texts)) as run_stage:
+            labels = self._predict(texts)
+            run_stage.rows_out = len(labels)
+            run_stage.extra["engine"] = dict(self.stats)
+        return labels
+
+    def _predict(self, texts):
+        start = time.time()
+        tokenizer = self.tokenizer
+        if tokenizer is None:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+
+        lengths = token_lengths(tokenizer, texts, self.max_length)
+        batches = make_batches(lengths, self.token_budget, self.max_batch_size)
+        batch_texts = [[texts[i] for i in batch] for batch in batches]
+
+        if self.workers == 1:
+            preds = [predict_batch(self.tokenizer, self.model, b, self.max_length, self.device) for b in batch_texts]
+        else:
+            preds = self._predict_parallel(batch_texts)
+
+        labels = [None] * len(texts)
+        for batch, batch_preds in zip(batches, preds):
+            for idx, p in zip(batch, batch_preds):
+                labels[idx] = int_to_label[p]
+
+        seconds = time.time() - start
+        self.stats = {
+            "texts": len(texts),
+            "batches": len(batches),
+            "tokens": int(lengths.sum()),
+            "padded_tokens": int(sum(len(b) * lengths[b[-1]] for b in batches)),
+            "seconds": seconds,
+            "texts_per_sec": len(texts) / seconds if seconds else float("nan"),
+        }
+        print(f"✅ Labeled {len(texts)} texts in {seconds:.1f}s ({self.stats['texts_per_sec']:.1f} texts/sec, {len(batches)} batches)")
+        return labels
+
+    def _predict_parallel(self, batch_texts):
+        # Every worker loads the model once and gets an interleaved share of the
+        # batches, so all of them see a mix of short and long texts
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        shares = [batch_texts[w::self.workers] for w in range(self.workers)]
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model_path, self.quantize, self.onnx, threads),
+        ) as pool:
+            results = list(pool.map(_predict_batches, shares, [self.max_length] * self.workers))
+
+        preds = [None] * len(batch_texts)
+        for w, share in enumerate(results):
+            preds[w::self.workers] = share
+        return preds
+
+def label_texts(texts, model_path, **kwargs):
+    return SentimentEngine(model_path, **kwargs).predict(texts)
@@ -0,0 +1,120 @@
+from collections import Counter
+import pandas as pd
+from prediction_cache import PredictionCache, cached_predict, models
+from storage import OUTPUT_FORMAT, read_table, write_table
+
+# Sentiment labeling between 1. ArcticShiftData.py and 3. MakeDataFile.py: reads
+# the wsb_arcticshift_* tables, labels every text with the fine-tuned FinBERT
+# (through the prediction cache, so only new texts are scored) and writes the
+# *_with_consensus tables script 3 reads. The other models' labels are taken
+# from the cache where finetune_nlp.ipynb stored them; consensus_score is the
+# same vote as in the notebook over the labels that are available (just FinBERT
+# for texts the other models never saw). With a distilled student
+# (distillation.py) FinBERT only labels the texts the student is unsure about.
+
+def vader_to_label(score):
+    if score >= 0.05:
+        return "positive"
+    elif score <= -0.05:
+        return "negative"
+    else:
+        return "neutral"
+
+def compute_consensus(votes):
+    # Majority vote; ties between neutral and a polar label go to the polar
+    # label, positive/negative ties to positive
+    votes = [v for v in votes if v is not None]
+    if not votes:
+        return None
+    top_two = Counter(votes).most_common(2)
+
+    if len(top_two) == 1 or top_two[0][1] > top_two[1][1]:
+        return top_two[0][0]
+
+    tied_labels = [label for label, count in top_two if count == 2]
+
+    if "neutral" in tied_labels:
+        if "positive" in tied_labels:
+            return "positive"
+        elif "negative" in tied_labels:
+            return "negative"
+
+    if set(tied_labels) == {"positive", "negative"}:
+        return "positive"
+
+    return top_two[0][0]
+
+def comment_texts(df):
+    return df["body"].fillna("").astype(str).tolist()
+
+def submission_texts(df):
+    title = df["title"].fillna("").astype(str) if "title" in df.columns else ""
+    selftext = df["selftext"].fillna("").astype(str) if "selftext" in df.columns else ""
+    return (title + " " + selftext).str.strip().tolist()
+
+def label_frame(df, texts, cache, predict):
+    # predict: texts -> FinBERT labels, or a ConfidenceRouter (which does its own caching)
+    df["text"] = texts
+    if hasattr(predict, "predict"):
+        df["finbert_finetuned_score"] = predict.predict(texts)
+    else:
+        df["finbert_finetuned_score"] = cached_predict(cache, texts, models["finbert"], predict)
+    df["vader_label"] = [None if v is None else vader_to_label(v) for v in cache.get_many(texts, models["vader"])]
+    df["bert_sentiment_score"] = cache.get_many(texts, models["bert"])
+    df["roberta_sentiment_label"] = cache.get_many(texts, models["roberta"])
+    df["consensus_score"] = [
+        compute_consensus(votes) for votes in zip(
+            df["vader_label"], df["bert_sentiment_score"], df["roberta_sentiment_label"], df["finbert_finetuned_score"]
+        )
+    ]
+    return df
+
+def lazy_predictor(model_path, **engine_args):
+    # engine_args go to SentimentEngine (quantize, onnx, workers, token_budget, device)
+    engine = []
+
+    def predict(texts):
+        # The model is only loaded if some text is not in the cache yet
+        if not engine:
+            from sentiment_inference import SentimentEngine
+            engine.append(SentimentEngine(model_path, **engine_args))
+        return engine[0].predict(texts)
+    return predict
+
+def labeling_predictor(model_path, cache, student_path=None, threshold=None, **engine_args):
+    # FinBERT, or the distilled student routing its uncertain texts to FinBERT
+    predict = lazy_predictor(model_path, **engine_args)
+    if student_path is None:
+        return predict
+    from distillation import ConfidenceRouter, HashedNgramStudent
+    return ConfidenceRouter(HashedNgramStudent.load(student_path), predict, threshold, cache)
+
+def consensus_labeler(model_path, cache_path="prediction_cache.sqlite", student_path=None, threshold=None, **engine_args):
+    # texts -> consensus labels, for labeling a few texts at a time (live_stream.py)
+    cache = PredictionCache(cache_path)
+    predict = labeling_predictor(model_path, cache, student_path, threshold, **engine_args)
+
+    def label(texts):
+        if not texts:
+            return []
+        df = label_frame(pd.DataFrame(index=range(len(texts))), list(texts), cache, predict)
+        return df["consensus_score"].tolist()
+    return label
+
+def label_tables(model_path, cache_path="prediction_cache.sqlite", comments_name="wsb_arcticshift_comments2023",
+                 submissions_name="wsb_arcticshift_submissions2023", fmt=OUTPUT_FORMAT, student_path=None,
+                 threshold=None, **engine_args):
+    cache = PredictionCache(cache_path)
+    predict = labeling_predictor(model_path, cache, student_path, threshold, **engine_args)
+    try:
+        submissions = read_table(submissions_name)
+        submissions = label_frame(submissions, submission_texts(submissions), cache, predict)
+        submission_path = write_table(submissions, "submissions_with_consensus", fmt=fmt, partition_on="date_est")
+
+        comments = read_table(comments_name)
+        comments = label_frame(comments, comment_texts(comments), cache, predict)
+        comment_path = write_table(comments, "comments_with_consensus", fmt=fmt, partition_on="post_date")
+    finally:
+        cache.close()
+    print(f"✅ Saved labeled submissions to {submission_path} and comments to {comment_path}")
+    return submission_path, comment_path
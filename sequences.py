@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Sliding windows for the LSTM (7. LSTM.ipynb). The scaled features are laid out
+# as a (ticker, date, feature) cube, so a window never runs from one ticker into
+# the next, and the windows of every length are strided views of that one cube.
+# Batches are gathered from the views when they are needed, so memory does not
+# grow with the window size or the number of windows.
+#
+# Like the old create_sequences, a window covers `window` days and its target is
+# the target of the day after the window.
+
+class WindowedPanel:
+    def __init__(self, df, X, y, ticker_col="ticker", date_col="date"):
+        # df: panel rows (needs ticker/date), X: scaled features in the same row order, y: targets
+        tickers, t_idx = np.unique(df[ticker_col].to_numpy(), return_inverse=True)
+        dates, d_idx = np.unique(pd.to_datetime(df[date_col]).to_numpy(), return_inverse=True)
+        X = np.asarray(X, dtype=np.float32)
+
+        self.tickers = tickers
+        self.dates = dates
+        self.X = np.zeros((len(tickers), len(dates), X.shape[1]), dtype=np.float32)
+        self.y = np.zeros((len(tickers), len(dates)), dtype=np.float32)
+        self.valid = np.zeros((len(tickers), len(dates)), dtype=bool)
+        self.X[t_idx, d_idx] = X
+        self.y[t_idx, d_idx] = np.asarray(y, dtype=np.float32)
+        self.valid[t_idx, d_idx] = True
+
+    @property
+    def n_features(self):
+        return self.X.shape[2]
+
+    def windows(self, window):
+        # (ticker, start, window, feature) view - nothing is copied
+        return sliding_window_view(self.X, window, axis=1).transpose(0, 1, 3, 2)
+
+    def index(self, window):
+        # (ticker, start) of every window whose days and target day all exist,
+        # in order of target date, then ticker
+        complete = sliding_window_view(self.valid, window + 1, axis=1).all(axis=-1)
+        starts, tickers = np.nonzero(complete.T)
+        return np.stack([tickers, starts], axis=1)
+
+    def split(self, window, val_size=0.2):
+        # Chronological train/validation split on the windows' target dates
+        index = self.index(window)
+        target_pos = index[:, 1] + window
+        cut = np.quantile(np.unique(target_pos), 1 - val_size, method="higher") if len(index) else 0
+        return index[target_pos < cut], index[target_pos >= cut]
+
+    def targets(self, window, index=None):
+        index = self.index(window) if index is None else index
+        return self.y[index[:, 0], index[:, 1] + window]
+
+    def arrays(self, window, index=None):
+        # Materialized (X, y) for the given windows, e.g. for a small test set
+        index = self.index(window) if index is None else index
+        return self.windows(window)[index[:, 0], index[:, 1]], self.targets(window, index)
+
+    def meta(self, window, index=None):
+        # Date and ticker of each window's target row
+        index = self.index(window) if index is None else index
+        return pd.DataFrame({"date": self.dates[index[:, 1] + window], "ticker": self.tickers[index[:, 0]]})
+
+    def batches(self, window, batch_size=16, index=None, shuffle=False, seed=42, labels=True):
+        # Lazy (X, y) batches; only one batch of windows is copied at a time
+        index = self.index(window) if index is None else index
+        views = self.windows(window)
+        rng = np.random.default_rng(seed)
+
+        def generate():
+            order = rng.permutation(len(index)) if shuffle else np.arange(len(index))
+            for i in range(0, len(order), batch_size):
+                t, s = index[order[i:i + batch_size]].T
+                yield (views[t, s], self.y[t, s + window]) if labels else views[t, s]
+
+        return generate
+
+    def tf_dataset(self, window, batch_size=16, index=None, shuffle=False, seed=42, labels=True):
+        import tensorflow as tf
+
+        x_spec = tf.TensorSpec(shape=(None, window, self.n_features), dtype=tf.float32)
+        y_spec = tf.TensorSpec(shape=(None,), dtype=tf.float32)
+        index = self.index(window) if index is None else index
+        generate = self.batches(window, batch_size, index, shuffle, seed, labels)
+        n_batches = -(-len(index) // batch_size)
+        return (
+            tf.data.Dataset.from_generator(generate, output_signature=(x_spec, y_spec) if labels else x_spec)
+            .apply(tf.data.experimental.assert_cardinality(n_batches))
+            .prefetch(tf.data.AUTOTUNE)
+        )
@@ -0,0 +1,140 @@
+import ast
+import os
+import shutil
+import pandas as pd
+
+# Parquet is the default format for every table the scripts write. Ticker lists
+# are stored as native list columns and timestamps keep their type, so nothing
+# has to be parsed back with ast.literal_eval. "csv" writes the old layout.
+OUTPUT_FORMAT = "parquet"
+LIST_COLUMNS = ("tickers_mentioned", "companies_mentioned")
+PARTITION_COLUMN = "partition_date"
+
+def table_path(name, fmt):
+    return f"{name}.{fmt}"
+
+def _modified(path):
+    # Last write to a file, or to any file of a partitioned parquet folder
+    times = [os.path.getmtime(path)]
+    for root, dirs, files in os.walk(path):
+        times += [os.path.getmtime(os.path.join(root, f)) for f in files]
+    return max(times)
+
+def stored_format(name):
+    # "parquet" or "csv", whichever was written last (the other one is stale
+    # after switching OUTPUT_FORMAT); None if the table does not exist
+    modified = {fmt: _modified(table_path(name, fmt)) for fmt in ("parquet", "csv") if os.path.exists(table_path(name, fmt))}
+    return max(modified, key=modified.get) if modified else None
+
+def write_table(df, name, fmt=OUTPUT_FORMAT, partition_on=None):
+    # partition_on: date column to split a parquet table into one folder per
+    # date (<name>.parquet/partition_date=YYYY-MM-DD/...)
+    path = table_path(name, fmt)
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+        return path
+    if fmt != "parquet":
+        raise ValueError(f"Unknown output format: {fmt}")
+
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path) and partition_on:
+        # A single-file table is replaced by the partition folder
+        os.remove(path)
+    if partition_on:
+        df = df.assign(**{PARTITION_COLUMN: pd.to_datetime(df[partition_on]).dt.strftime("%Y-%m-%d")})
+        df.to_parquet(path, index=False, partition_cols=[PARTITION_COLUMN])
+    else:
+        df.to_parquet(path, index=False)
+    return path
+
+def append_table(df, name, fmt=OUTPUT_FORMAT, partition_on=None, sort_by=None):
+    # Add rows to a table written by write_table. For a partitioned parquet table
+    # only the partitions present in df are (re)written; any other table is
+    # read, merged and written again. Rows of existing dates in df are replaced.
+    path = table_path(name, fmt)
+    if fmt == "parquet" and partition_on and os.path.isdir(path) and stored_format(name) == "parquet":
+        df = df.assign(**{PARTITION_COLUMN: pd.to_datetime(df[partition_on]).dt.strftime("%Y-%m-%d")})
+        df.to_parquet(path, index=False, partition_cols=[PARTITION_COLUMN],
+                      existing_data_behavior="delete_matching")
+        return path
+
+    existing = read_table(name)
+    if partition_on:
+        # CSV gives the dates back as strings
+        existing[partition_on] = pd.to_datetime(existing[partition_on])
+        df = df.assign(**{partition_on: pd.to_datetime(df[partition_on])})
+        existing = existing[~existing[partition_on].isin(df[partition_on]).to_numpy()]
+    combined = pd.concat([existing, df], ignore_index=True)
+    if sort_by:
+        combined = combined.sort_values(by=sort_by, kind="mergesort")
+    return write_table(combined, name, fmt=fmt, partition_on=partition_on if fmt == "parquet" else None)
+
+def table_exists(name):
+    return stored_format(name) is not None
+
+def latest_date(name, date_column):
+    # Last date in a table; for partitioned tables only the folder names are read
+    path = table_path(name, "parquet")
+    if os.path.isdir(path) and stored_format(name) == "parquet":
+        prefix = PARTITION_COLUMN + "="
+        dates = [d[len(prefix):] for d in os.listdir(path) if d.startswith(prefix)]
+        return pd.Timestamp(max(dates)) if dates else None
+    dates = pd.to_datetime(read_table(name, columns=[date_column])[date_column])
+    return dates.max() if len(dates) else None
+
+def day_string(date):
+    return pd.Timestamp(date).strftime("%Y-%m-%d")
+
+def parse_list(x):
+    return ast.literal_eval(x) if pd.notnull(x) and isinstance(x, str) else []
+
+def read_table(name, columns=None, start_date=None, end_date=None, date_column=None):
+    # Reads <name>.parquet or <name>.csv, whichever was written last. start_date (inclusive)
+    # and end_date (exclusive) select partitions of a partitioned parquet table;
+    # other tables are filtered on date_column after loading.
+    fmt = stored_format(name) or "csv"
+    path = table_path(name, fmt)
+    partitioned = os.path.isdir(path)
+    filter_dates = not partitioned and date_column and (start_date or end_date)
+    extra = filter_dates and columns is not None and date_column not in columns
+    if extra:
+        # The date column is only read for the filter
+        columns = list(columns) + [date_column]
+
+    if fmt == "parquet":
+        filters = []
+        if partitioned and start_date:
+            filters.append((PARTITION_COLUMN, ">=", day_string(start_date)))
+        if partitioned and end_date:
+            filters.append((PARTITION_COLUMN, "<", day_string(end_date)))
+        df = pd.read_parquet(path, columns=columns, filters=filters or None)
+        if PARTITION_COLUMN in df.columns:
+            df = df.drop(columns=PARTITION_COLUMN)
+        for col in LIST_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].apply(lambda x: list(x) if x is not None else [])
+    else:
+        df = pd.read_csv(path, usecols=columns)
+        for col in LIST_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].apply(parse_list)
+
+    if filter_dates:
+        values = df[date_column]
+        dates = (to_utc(values) if pd.api.types.is_numeric_dtype(values) else pd.to_datetime(values)).dt.strftime("%Y-%m-%d")
+        mask = pd.Series(True, index=df.index)
+        if start_date:
+            mask &= dates >= day_string(start_date)
+        if end_date:
+            mask &= dates < day_string(end_date)
+        df = df[mask]
+        if extra:
+            df = df.drop(columns=date_column)
+    return df.reset_index(drop=True)
+
+def to_utc(series):
+    # Epoch seconds (CSV / old files) or typed timestamps (parquet) -> UTC datetimes
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.to_datetime(series, unit="s", utc=True)
+    return pd.to_datetime(series, utc=True)
@@ -0,0 +1,196 @@
+import numpy as np
+import pandas as pd
+
+# Synthetic r/wallstreetbets data for benchmark.py, so the pipeline stages can be
+# timed without API access or the Drive files. The generated tables have the
+# same columns as the real ones (russel_3000.csv, API submissions/comments, the
+# *_with_consensus tables and the price store); the text is random filler with
+# tickers and company names mixed in at a fixed rate. Everything is driven by
+# one seed, so two runs with the same arguments give the same data.
+
+filler_words = [
+    "the", "to", "is", "calls", "puts", "moon", "buy", "sell", "hold", "dip", "rip",
+    "earnings", "guh", "bagholder", "tendies", "print", "squeeze", "short", "long",
+    "market", "fed", "rates", "cpi", "apes", "today", "tomorrow", "week", "green",
+    "red", "bears", "bulls", "yolo", "options", "expiry", "strike", "theta", "gang",
+    "loss", "gain", "hands", "wife", "boyfriend", "wendys", "lol", "this", "why",
+]
+syllables = ["ar", "bo", "cor", "da", "el", "fin", "gen", "hex", "io", "jet", "ka", "lum",
+             "mar", "nov", "or", "pax", "quan", "ro", "syn", "tek", "ul", "ver", "wex", "zen"]
+name_suffixes = ["Inc", "Corp", "Holdings", "Group", "Co", "Ltd", "PLC", "Class A"]
+flairs = ["Discussion", "DD", "YOLO", "Gain", "Loss", "Meme", "News", "Daily Discussion", "Chart"]
+consensus_values = np.array(["positive", "neutral", "negative"])
+bot_bodies = ["Thanks for your submission! Please read the rules.", "**User Report** | | | |", "I am bot, beep boop"]
+
+def base36(n):
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    out = ""
+    while True:
+        n, r = divmod(n, 36)
+        out = digits[r] + out
+        if not n:
+            return out
+
+# --- Companies ---
+def make_companies(n_tickers, seed=42):
+    # Ticker;Name like russel_3000.csv, 2-5 letter tickers and 1-3 word names
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    tickers = {}
+    while len(tickers) < n_tickers:
+        ticker = "".join(rng.choice(letters, rng.integers(2, 6)))
+        if ticker not in tickers:
+            words = ["".join(rng.choice(syllables, rng.integers(2, 4))).capitalize() for _ in range(rng.integers(1, 4))]
+            tickers[ticker] = " ".join(words) + " " + rng.choice(name_suffixes)
+    return pd.DataFrame({"Ticker": list(tickers), "Name": list(tickers.values())})
+
+def company_keywords(companies):
+    # Upper-case words of each name without the suffix, used to mention companies by name
+    return [name.upper().rsplit(" ", 1)[0].replace(" CLASS", "").split() for name in companies["Name"]]
+
+# --- Text ---
+def make_texts(rng, n, companies, mention_rate=0.3, min_words=4, max_words=40):
+    # mention_rate: share of texts naming a company (its ticker, $ticker or name)
+    tickers = companies["Ticker"].to_numpy()
+    keywords = company_keywords(companies)
+    n_words = rng.integers(min_words, max_words + 1, n)
+    words = rng.choice(filler_words, int(n_words.sum()))
+    mentions = rng.random(n) < mention_rate
+    # Popular tickers are mentioned much more often (Zipf-like)
+    picks = np.minimum(rng.zipf(1.3, n) - 1, len(tickers) - 1)
+    styles = rng.integers(0, 3, n)
+
+    texts = []
+    pos = 0
+    for i in range(n):
+        text = list(words[pos:pos + n_words[i]])
+        pos += n_words[i]
+        if mentions[i]:
+            at = int(rng.integers(0, len(text) + 1))
+            c = picks[i]
+            mention = tickers[c] if styles[i] == 0 else "$" + tickers[c] if styles[i] == 1 else " ".join(keywords[c]).title()
+            text.insert(at, mention)
+        texts.append(" ".join(text))
+    return texts
+
+# --- Submissions and comments ---
+def make_submissions(n_posts, companies, start_date="2024-04-01", days=60, seed=42):
+    # API-style submission dicts; the first post of every day is its daily discussion thread
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(start_date, tz="UTC").timestamp()
+    days = max(1, min(days, n_posts))
+    created = np.sort(start + rng.random(n_posts) * days * 86400).astype(int)
+    titles = make_texts(rng, n_posts, companies, max_words=12)
+    selftexts = make_texts(rng, n_posts, companies, mention_rate=0.2, min_words=0, max_words=120)
+    scores = rng.pareto(1.2, n_posts).astype(int)
+    posts = [
+        {
+            "id": base36(10**9 + i), "created_utc": int(created[i]), "author": f"user{rng.integers(10**6)}",
+            "link_flair_text": flairs[rng.integers(len(flairs))], "num_comments": int(rng.integers(0, 500)),
+            "score": int(scores[i]), "selftext": selftexts[i], "title": titles[i],
+            "upvote_ratio": float(rng.random()), "url": "", "permalink": "", "no_follow": False, "media": None,
+        }
+        for i in range(n_posts)
+    ]
+    # One daily discussion thread per day
+    for day in range(days):
+        post = posts[min(int(np.searchsorted(created, start + day * 86400)), n_posts - 1)]
+        date = pd.Timestamp(post["created_utc"], unit="s").strftime("%B %d, %Y")
+        post.update(title=f"Daily Discussion Thread for {date}", link_flair_text="Daily Discussion")
+    return posts
+
+def comment_pages(n_comments, posts, companies, seed=42, page_size=100, duplicate_rate=0.01,
+                  bot_rate=0.02, daily_share=0.7, chunk_size=100_000):
+    # API-style comment pages (lists of dicts), generated chunk by chunk so 10M
+    # comments never sit in memory at once. Most comments go to the daily
+    # threads; a few are duplicates of earlier ones or bot messages.
+    rng = np.random.default_rng(seed)
+    daily = [p for p in posts if p["link_flair_text"] == "Daily Discussion"]
+    others = [p for p in posts if p["link_flair_text"] != "Daily Discussion"] or daily
+    next_id = 0
+    previous = []
+    for start in range(0, n_comments, chunk_size):
+        n = min(chunk_size, n_comments - start)
+        bodies = make_texts(rng, n, companies)
+        to_daily = rng.random(n) < daily_share
+        thread = np.where(to_daily, rng.integers(0, len(daily), n), rng.integers(0, len(others), n))
+        scores = (rng.pareto(1.5, n) * 3).astype(int) - 1
+        delays = rng.integers(0, 86400, n)
+        bots = rng.random(n) < bot_rate
+        duplicates = rng.random(n) < duplicate_rate
+
+        page = []
+        for i in range(n):
+            if duplicates[i] and previous:
+                page.append(previous[int(rng.integers(len(previous)))])
+            else:
+                post = daily[thread[i]] if to_daily[i] else others[thread[i]]
+                body = bot_bodies[i % len(bot_bodies)] if bots[i] else bodies[i]
+                page.append({
+                    "id": base36(36**6 + next_id), "link_id": "t3_" + post["id"], "body": body,
+                    "score": int(scores[i]), "created_utc": post["created_utc"] + int(delays[i]),
+                })
+                next_id += 1
+            if len(page) == page_size:
+                previous = page[-10:]
+                yield page
+                page = []
+        if page:
+            previous = page[-10:]
+            yield page
+
+# --- Scored tables (input of 3. MakeDataFile.py) ---
+def make_scored_comments(n_comments, companies, start_date="2024-04-01", days=60, seed=42, mention_rate=0.3):
+    # comments_with_consensus: one row per comment with its tickers and FinBERT label
+    rng = np.random.default_rng(seed)
+    tickers = companies["Ticker"].to_numpy()
+    start = pd.Timestamp(start_date, tz="UTC")
+    created = start + pd.to_timedelta(rng.random(n_comments) * days * 86400, unit="s")
+    n_mentions = np.where(rng.random(n_comments) < mention_rate, rng.integers(1, 4, n_comments), 0)
+    picks = np.minimum(rng.zipf(1.3, int(n_mentions.sum())) - 1, len(tickers) - 1)
+    bounds = np.concatenate([[0], np.cumsum(n_mentions)])
+    return pd.DataFrame({
+        "post_created_utc": created,
+        "comment_score": (rng.pareto(1.5, n_comments) * 3).astype(int) - 1,
+        "tickers_mentioned": [list(dict.fromkeys(tickers[picks[a:b]])) for a, b in zip(bounds[:-1], bounds[1:])],
+        "consensus_score": rng.choice(consensus_values, n_comments, p=[0.35, 0.4, 0.25]),
+    })
+
+def make_scored_submissions(n_posts, companies, start_date="2024-04-01", days=60, seed=42, mention_rate=0.4):
+    # submissions_with_consensus
+    rng = np.random.default_rng(seed + 1)
+    tickers = companies["Ticker"].to_numpy()
+    start = pd.Timestamp(start_date)
+    created = start + pd.to_timedelta(rng.random(n_posts) * days * 86400, unit="s")
+    n_mentions = np.where(rng.random(n_posts) < mention_rate, rng.integers(1, 3, n_posts), 0)
+    picks = np.minimum(rng.zipf(1.3, int(n_mentions.sum())) - 1, len(tickers) - 1)
+    bounds = np.concatenate([[0], np.cumsum(n_mentions)])
+    return pd.DataFrame({
+        "datetime_est": created.strftime("%Y-%m-%d %H:%M:%S"),
+        "score": rng.pareto(1.2, n_posts).astype(int),
+        "num_comments": rng.integers(0, 500, n_posts),
+        "link_flair_text": rng.choice(np.array(flairs + [None], dtype=object), n_posts),
+        "companies_mentioned": [list(dict.fromkeys(tickers[picks[a:b]])) for a, b in zip(bounds[:-1], bounds[1:])],
+        "consensus_score": rng.choice(consensus_values, n_posts, p=[0.35, 0.4, 0.25]),
+    })
+
+# --- Prices ---
+def make_prices(tickers, start_date="2024-04-01", days=60, seed=42):
+    # Long price table like PriceStore.long(): ticker, date, closing_price, volume
+    # (business days; a few prices are missing to exercise the forward-fill)
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(start_date, periods=max(2, int(days * 5 / 7)))
+    n_t, n_d = len(tickers), len(dates)
+    returns = rng.normal(0.0005, 0.03, (n_t, n_d))
+    prices = rng.uniform(2, 500, (n_t, 1)) * np.exp(np.cumsum(returns, axis=1))
+    volume = rng.lognormal(13, 1.5, (n_t, n_d)).round()
+    missing = rng.random((n_t, n_d)) < 0.01
+    missing[:, 0] = False
+    prices[missing] = np.nan
+    volume[missing] = np.nan
+    return pd.DataFrame({
+        "ticker": np.repeat(np.asarray(tickers), n_d),
+        "date": np.tile(dates.to_numpy(), n_t),
+        "closing_price": prices.ravel(),
+        "volume": volume.ravel(),
+    })
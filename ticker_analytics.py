@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+
+# Cross-ticker statistics for 4. RedditEDA.ipynb. Mentions, prices and volumes
+# are pivoted once into date x ticker matrices on the same dates and tickers;
+# every statistic is then computed for all tickers at once with NumPy instead
+# of filtering and merging ticker by ticker.
+#
+# Missing values are handled pairwise like an inner merge on date: a day only
+# counts for a ticker if both series have a (finite) value on it. Lags are taken on the
+# date index (one row = one date), so for a matrix of trading days lag 1 is the
+# previous trading day.
+
+def pivot(df, value, date_col="date", ticker_col="ticker"):
+    # Long (date, ticker, value) rows -> date x ticker matrix (duplicates summed,
+    # a missing value stays NaN instead of becoming 0)
+    dates = pd.to_datetime(df[date_col]).rename(date_col)
+    matrix = df[value].groupby([dates, df[ticker_col]]).sum(min_count=1).unstack(ticker_col)
+    matrix.columns.name = ticker_col
+    return matrix.astype(float)
+
+def wide(df, date_col="Date"):
+    # Wide tables like valid_tickers_volumes (Date + one column per ticker) -> date x ticker matrix
+    return df.assign(**{date_col: pd.to_datetime(df[date_col])}).set_index(date_col).rename_axis("date")
+
+def align(*matrices, how="inner"):
+    # Same dates and tickers (in the same order) for every matrix; how="inner"
+    # keeps the dates/tickers all of them have, "outer" every date/ticker
+    dates, tickers = matrices[0].index, matrices[0].columns
+    for m in matrices[1:]:
+        dates = dates.intersection(m.index) if how == "inner" else dates.union(m.index)
+        tickers = tickers.intersection(m.columns) if how == "inner" else tickers.union(m.columns)
+    dates, tickers = dates.sort_values(), tickers.sort_values()
+    return [m.reindex(index=dates, columns=tickers).astype(float) for m in matrices]
+
+def returns(prices):
+    # Daily returns per ticker (pct_change without filling gaps)
+    return prices.pct_change(fill_method=None)
+
+# --- Correlation ---
+def _pairwise(a, b, min_periods):
+    # Column-wise Pearson correlation over the rows where both are present
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    mask = np.isfinite(a) & np.isfinite(b)
+    n = mask.sum(axis=0)
+    a = np.where(mask, a, 0.0)
+    b = np.where(mask, b, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        a = np.where(mask, a - a.sum(axis=0) / n, 0.0)
+        b = np.where(mask, b - b.sum(axis=0) / n, 0.0)
+        r = (a * b).sum(axis=0) / np.sqrt((a * a).sum(axis=0) * (b * b).sum(axis=0))
+    r = np.clip(r, -1.0, 1.0)
+    r[n < max(min_periods, 2)] = np.nan
+    return r, n
+
+def p_values(r, n):
+    # Two-sided p-value of a Pearson correlation (same as scipy.stats.pearsonr)
+    from scipy import stats
+    r, n = np.asarray(r, dtype=float), np.asarray(n, dtype=float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dof = n - 2
+        t = r * np.sqrt(dof / ((1.0 - r) * (1.0 + r)))
+        return np.where(dof > 0, 2 * stats.t.sf(np.abs(t), dof), np.nan)
+
+def correlations(x, y, min_periods=2, pvalues=True):
+    # One row per ticker: correlation of x and y, observations used, p-value
+    x, y = align(x, y)
+    r, n = _pairwise(x.to_numpy(), y.to_numpy(), min_periods)
+    out = pd.DataFrame({"ticker": x.columns, "correlation": r, "n": n})
+    if pvalues:
+        out["p_value"] = p_values(r, n)
+    return out.dropna(subset=["correlation"]).sort_values("correlation", ascending=False).reset_index(drop=True)
+
+def lead_lag(x, y, lags=range(-5, 6), min_periods=10):
+    # Correlation of x today with y `lag` rows later, for every ticker and lag
+    # (positive lag: x leads y). Returns a ticker x lag matrix.
+    x, y = align(x, y)
+    a = x.to_numpy()
+    b = y.to_numpy()
+    out = {}
+    for lag in lags:
+        shifted = np.full_like(b, np.nan)
+        if lag >= 0:
+            shifted[:len(b) - lag] = b[lag:]
+        else:
+            shifted[-lag:] = b[:lag]
+        out[lag] = _pairwise(a, shifted, min_periods)[0]
+    return pd.DataFrame(out, index=x.columns).rename_axis(index="ticker", columns="lag")
+
+def best_lag(lead_lag_matrix):
+    # Lag with the strongest (absolute) correlation per ticker
+    m = lead_lag_matrix.dropna(how="all")
+    values = m.to_numpy()
+    idx = np.nanargmax(np.abs(values), axis=1)
+    return pd.DataFrame({
+        "ticker": m.index,
+        "lag": m.columns.to_numpy()[idx],
+        "correlation": values[np.arange(len(m)), idx],
+    }).sort_values("correlation", key=np.abs, ascending=False).reset_index(drop=True)
+
+# --- Spikes ---
+def zscores(m, window=None, min_periods=None):
+    # window=None: z-score against the ticker's whole series (like scipy zscore, ddof=0);
+    # otherwise against the previous `window` rows, so a spike is judged on the past only
+    if window is None:
+        return (m - m.mean()) / m.std(ddof=0)
+    past = m.shift(1).rolling(window, min_periods=min_periods or window)
+    return (m - past.mean()) / past.std(ddof=0)
+
+def spikes(m, threshold=2.0, window=None, min_periods=None, **extra):
+    # Long (date, ticker, value, zscore) rows with z > threshold; extra matrices
+    # (e.g. returns=...) are added as columns for the same date and ticker
+    z = zscores(m, window, min_periods)
+    rows, cols = np.nonzero((z > threshold).to_numpy())
+    out = pd.DataFrame({
+        "date": m.index[rows],
+        "ticker": m.columns[cols],
+        "value": m.to_numpy()[rows, cols],
+        "zscore": z.to_numpy()[rows, cols],
+    })
+    for name, other in extra.items():
+        other = other.reindex(index=m.index, columns=m.columns)
+        out[name] = other.to_numpy()[rows, cols]
+    return out.sort_values(["date", "zscore"], ascending=[True, False]).reset_index(drop=True)
+
+# --- Granger causality ---
+def _lagged(m, lag):
+    out = np.full_like(m, np.nan)
+    out[lag:] = m[:len(m) - lag]
+    return out
+
+def _batched_ssr(y, X):
+    # Least squares for every ticker at once. y: (T, N), X: (T, N, k) with the
+    # rows of a ticker that are not used set to zero.
+    xtx = np.einsum("tnk,tnj->nkj", X, X)
+    xty = np.einsum("tnk,tn->nk", X, y)
+    beta = _solve(xtx, xty)
+    resid = y - np.einsum("tnk,nk->tn", X, beta)
+    return (resid ** 2).sum(axis=0)
+
+def _solve(xtx, xty):
+    # Batched solve; singular systems (e.g. a constant series) get NaN. Checked on
+    # the condition number, not the determinant: returns and counts differ a lot in scale
+    beta = np.full(xty.shape, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ok = np.linalg.cond(xtx) < 1e14
+    if ok.any():
+        beta[ok] = np.linalg.solve(xtx[ok], xty[ok][..., None])[..., 0]
+    return beta
+
+def granger(y, x, maxlag=5, min_obs=20):
+    # Does x Granger-cause y? For every ticker and lag p = 1..maxlag, the SSR
+    # F-test of y on p lags of y versus p lags of y and x (statsmodels'
+    # grangercausalitytests "ssr_ftest"). Dates with a missing value in any
+    # of the lags are left out for that ticker.
+    from scipy import stats
+
+    y, x = align(y, x)
+    Y, Xs = y.to_numpy(), x.to_numpy()
+    T, N = Y.shape
+    results = []
+    for p in range(1, maxlag + 1):
+        y_lags = [_lagged(Y, k) for k in range(1, p + 1)]
+        x_lags = [_lagged(Xs, k) for k in range(1, p + 1)]
+        restricted = np.stack([np.ones_like(Y)] + y_lags, axis=-1)
+        full = np.concatenate([restricted, np.stack(x_lags, axis=-1)], axis=-1)
+        valid = np.isfinite(Y) & np.isfinite(full).all(axis=-1)
+        n = valid.sum(axis=0)
+
+        target = np.where(valid, Y, 0.0)
+        ssr_r = _batched_ssr(target, np.where(valid[..., None], restricted, 0.0))
+        ssr_u = _batched_ssr(target, np.where(valid[..., None], full, 0.0))
+        dof = n - 2 * p - 1
+        with np.errstate(invalid="ignore", divide="ignore"):
+            f = ((ssr_r - ssr_u) / p) / (ssr_u / dof)
+            p_value = np.where(dof > 0, stats.f.sf(f, p, np.maximum(dof, 1)), np.nan)
+        keep = n >= max(min_obs, 2 * p + 2)
+        results.append(pd.DataFrame({
+            "ticker": y.columns[keep], "lag": p, "f_stat": f[keep], "p_value": p_value[keep], "n": n[keep],
+        }))
+    return pd.concat(results, ignore_index=True)
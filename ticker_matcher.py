@@ -0,0 +1,126 @@
+import re
+import pandas as pd
+
+# --- Clean company names ---
+remove_words = ["INC", "CORP", "CO", "COM", "LTD", "PLC", "COMPANY", "INCORPORATED", "HOLDINGS", "GROUP", "CLASS A", "CLASS B", "CLASS C", "CVR"]
+
+def clean_name(name):
+    if not isinstance(name, str):
+        return []
+    pattern = r'\b(?:' + '|'.join(remove_words) + r')\b'
+    name = re.sub(pattern, '', name.upper())
+    name = re.sub(r'[^A-Z0-9 ]', '', name)
+    name = re.sub(r'\s+', ' ', name)
+    name = name.strip()
+    return name, name.split()
+
+# --- Load Russell 3000 ---
+def load_company_dict(path="russel_3000.csv"):
+    companies_df = pd.read_csv(path, sep=";")
+    companies_df["CleanNameTuple"] = companies_df["Name"].apply(clean_name)
+    companies_df["CleanKeywords"] = companies_df["CleanNameTuple"].apply(lambda x: x[1])
+
+    # Only include tickers with 2+ characters
+    return {
+        row["Ticker"]: (row["CleanKeywords"], row["Ticker"])
+        for _, row in companies_df.iterrows()
+        if isinstance(row["Ticker"], str) and len(row["Ticker"]) >= 2
+    }
+
+# --- Reference matcher (one regex scan per ticker and keyword) ---
+# Kept to check TickerMatcher against, see check_parity below
+def find_companies_regex(text, company_dict):
+    found = []
+    if not isinstance(text, str):
+        return found
+    text_upper = text.upper()
+    for ticker, (keywords, ticker_str) in company_dict.items():
+        name_match = all(re.search(rf'\b{re.escape(word)}\b', text_upper) for word in keywords)
+        ticker_match = re.search(rf'\b{re.escape(ticker_str)}\b', text)
+        if name_match or ticker_match:
+            found.append(ticker)
+    return found
+
+# --- Single-pass matcher ---
+# `\bWORD\b` matches exactly when WORD is a whole run of word characters, so for
+# tickers and keywords made only of word characters we can tokenize the text once
+# and do set lookups instead of running one regex per ticker.
+WORD_RE = re.compile(r'\w+')
+
+class TickerMatcher:
+    def __init__(self, company_dict):
+        self.order = {ticker: i for i, ticker in enumerate(company_dict)}
+        self.ticker_index = {}   # token -> tickers whose symbol is that token (case-sensitive)
+        self.ticker_regexes = [] # symbols like "BRK.B" that need the original regex
+        self.name_index = {}     # anchor keyword -> [(ticker, keywords), ...]
+        self.always = []         # names that clean to nothing match every text
+
+        for ticker, (keywords, ticker_str) in company_dict.items():
+            if WORD_RE.fullmatch(ticker_str):
+                self.ticker_index.setdefault(ticker_str, []).append(ticker)
+            else:
+                self.ticker_regexes.append((ticker, re.compile(rf'\b{re.escape(ticker_str)}\b')))
+
+            keywords = frozenset(keywords)
+            if not keywords:
+                self.always.append(ticker)
+                continue
+            # Anchor on the longest keyword - long words are rarely in a comment,
+            # so fewer candidates need the full all-keywords check
+            anchor = max(sorted(keywords), key=len)
+            self.name_index.setdefault(anchor, []).append((ticker, keywords))
+
+    @classmethod
+    def from_csv(cls, path="russel_3000.csv"):
+        return cls(load_company_dict(path))
+
+    def find(self, text):
+        if not isinstance(text, str):
+            return []
+        found = set(self.always)
+
+        for token in set(WORD_RE.findall(text)):
+            found.update(self.ticker_index.get(token, ()))
+        for ticker, pattern in self.ticker_regexes:
+            if pattern.search(text):
+                found.add(ticker)
+
+        upper_tokens = set(WORD_RE.findall(text.upper()))
+        for token in upper_tokens:
+            for ticker, keywords in self.name_index.get(token, ()):
+                if keywords <= upper_tokens:
+                    found.add(ticker)
+
+        # Same order as find_companies_regex (company_dict order)
+        return sorted(found, key=self.order.__getitem__)
+
+    __call__ = find
+
+def check_parity(matcher, company_dict, texts):
+    mismatches = []
+    for text in texts:
+        expected = find_companies_regex(text, company_dict)
+        actual = matcher.find(text)
+        if expected != actual:
+            mismatches.append((text, expected, actual))
+    return mismatches
+
+
+if __name__ == "__main__":
+    # Parity check: python ticker_matcher.py wsb_arcticshift_comments2023.csv body
+    import sys
+    import time
+
+    texts_path = sys.argv[1]
+    text_column = sys.argv[2] if len(sys.argv) > 2 else "body"
+
+    company_dict = load_company_dict()
+    matcher = TickerMatcher(company_dict)
+    texts = pd.read_csv(texts_path)[text_column].tolist()
+
+    start = time.perf_counter()
+    mismatches = check_parity(matcher, company_dict, texts)
+    print(f"Checked {len(texts)} texts in {time.perf_counter() - start:.1f}s")
+    for text, expected, actual in mismatches[:20]:
+        print(f"❌ {text[:80]!r}: regex={expected} matcher={actual}")
+    print("✅ Matcher agrees with find_companies" if not mismatches else f"❌ {len(mismatches)} mismatches")
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+import numpy as np
+import torch
+from transformers import Trainer
+
+# Training data path for finetune_nlp.ipynb. Texts are tokenized once (no
+# padding) into a flat int32 token file plus offsets on disk; the dataset
+# memory-maps them, so items are slices of the file rather than new tensors and
+# labeled sets larger than memory work. Batches are padded only to their
+# longest text, and the sampler puts texts of similar length in one batch.
+
+def texts_hash(texts, tokenizer, max_length):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{getattr(tokenizer, 'name_or_path', '')}|{max_length}".encode("utf-8"))
+    for text in texts:
+        h.update(str(text).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+def build_token_cache(tokenizer, texts, path, max_length=512, chunk_size=10000):
+    # Writes <path>/input_ids.bin, offsets.npy and meta.json; reused as long as
+    # the texts, tokenizer and max_length are the same
+    texts = [str(t) for t in texts]
+    key = texts_hash(texts, tokenizer, max_length)
+    meta_path = os.path.join(path, "meta.json")
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            if json.load(f).get("hash") == key:
+                print(f"✅ Using token cache in {path}")
+                return path
+
+    os.makedirs(path, exist_ok=True)
+    offsets = [0]
+    with open(os.path.join(path, "input_ids.bin"), "wb") as f:
+        for i in range(0, len(texts), chunk_size):
+            ids = tokenizer(texts[i:i + chunk_size], truncation=True, max_length=max_length)["input_ids"]
+            for x in ids:
+                f.write(np.asarray(x, dtype=np.int32).tobytes())
+                offsets.append(offsets[-1] + len(x))
+    np.save(os.path.join(path, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"hash": key, "texts": len(texts), "tokens": offsets[-1], "max_length": max_length,
+                   "pad_token_id": tokenizer.pad_token_id}, f, indent=1)
+    print(f"✅ Tokenized {len(texts)} texts ({offsets[-1]} tokens) into {path}")
+    return path
+
+
+class TokenDataset:
+    # Map-style dataset over a token cache; items are read-only views into the
+    # memory-mapped file (the collator copies them once into the padded batch)
+    def __init__(self, path, labels=None):
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        size = int(self.offsets[-1])
+        self.ids = np.memmap(os.path.join(path, "input_ids.bin"), dtype=np.int32, mode="r", shape=(size,)) if size else np.empty(0, dtype=np.int32)
+        self.lengths = np.diff(self.offsets)
+        self.labels = None if labels is None else np.asarray(labels, dtype=np.int64)
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.pad_token_id = json.load(f)["pad_token_id"]
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, idx):
+        item = {"input_ids": self.ids[self.offsets[idx]:self.offsets[idx + 1]]}
+        if self.labels is not None:
+            item["labels"] = self.labels[idx]
+        return item
+
+
+class DynamicPaddingCollator:
+    # Pads a batch to its longest item (rounded up to pad_to_multiple_of)
+    def __init__(self, pad_token_id=0, pad_to_multiple_of=8):
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, items):
+        longest = max(len(item["input_ids"]) for item in items)
+        if self.pad_to_multiple_of:
+            longest = -(-longest // self.pad_to_multiple_of) * self.pad_to_multiple_of
+        input_ids = np.full((len(items), longest), self.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(items), longest), dtype=np.int64)
+        for row, item in enumerate(items):
+            n = len(item["input_ids"])
+            input_ids[row, :n] = item["input_ids"]
+            attention_mask[row, :n] = 1
+
+        batch = {"input_ids": torch.from_numpy(input_ids), "attention_mask": torch.from_numpy(attention_mask)}
+        if "labels" in items[0]:
+            batch["labels"] = torch.tensor([int(item["labels"]) for item in items])
+        return batch
+
+
+class LengthGroupedSampler:
+    # Shuffles, then sorts by length within mega-batches of batch_size x
+    # mega_batch_mult items: batches hold similar lengths but the order still
+    # changes every epoch. The longest batch goes first so memory errors show early.
+    def __init__(self, lengths, batch_size, mega_batch_mult=50, seed=42):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.mega_batch_size = batch_size * mega_batch_mult
+        self.seed = seed
+        self.epoch = 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        self.epoch += 1
+        order = rng.permutation(len(self.lengths))
+        megas = [order[i:i + self.mega_batch_size] for i in range(0, len(order), self.mega_batch_size)]
+        megas = [mega[np.argsort(-self.lengths[mega], kind="stable")] for mega in megas]
+        if megas:
+            longest = max(range(len(megas)), key=lambda m: self.lengths[megas[m][0]])
+            megas[0], megas[longest] = megas[longest], megas[0]
+        for mega in megas:
+            yield from (int(i) for i in mega)
+
+
+class LengthGroupedTrainer(Trainer):
+    # Trainer that draws the training set through LengthGroupedSampler
+    def _get_train_sampler(self, *args, **kwargs):
+        return LengthGroupedSampler(self.train_dataset.lengths, self.args.per_device_train_batch_size,
+                                    seed=self.args.seed)